@@ -0,0 +1,118 @@
+# bench_cluster.py — commands/s of the sharded worker mode for 1..N workers
+# usage: python bench_cluster.py [max_workers] [users]
+# Telegram is replaced by an in-process request backend (PTB's BaseRequest extension
+# point), so the numbers cover update decoding, routing, handlers and SQLite only.
+# Two mixes: "read" never writes; "write" is /claim, where every command is a
+# run_tx (quest row + coins + exp) plus ledger rows, so all workers contend for
+# SQLite's single write lock.
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from telegram.ext import ApplicationBuilder
+from telegram.request import BaseRequest
+import cluster
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+MIXES = {
+    "read": ["/balance", "/profile"],
+    "write": ["/claim 1", "/claim 2", "/claim 3"],
+}
+
+class OfflineRequest(BaseRequest):
+    """Answers every Bot API call locally with a minimal valid payload."""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return 1.0
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if url.endswith("/getMe"):
+            result = BOT_USER
+        else:
+            result = {"message_id": 1, "date": int(time.time()), "chat": {"id": 1, "type": "private"}, "text": "ok"}
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+def offline_builder():
+    return ApplicationBuilder().request(OfflineRequest()).get_updates_request(OfflineRequest())
+
+def make_updates(users: int, commands: list) -> list:
+    ups, uid_base, n = [], 10_000, 0
+    for cmd in commands:
+        for u in range(users):
+            n += 1
+            uid = uid_base + u
+            ups.append({
+                "update_id": n,
+                "message": {
+                    "message_id": n, "date": int(time.time()), "text": cmd,
+                    "chat": {"id": uid, "type": "private"},
+                    "from": {"id": uid, "is_bot": False, "first_name": f"u{u}"},
+                    "entities": [{"type": "bot_command", "offset": 0, "length": len(cmd.split()[0])}],
+                },
+            })
+    return ups
+
+def run_once(n_workers: int, updates: list) -> float:
+    done = mp.get_context("spawn").Value("q", 0)
+    inboxes, procs = cluster.start_workers(n_workers, done, token="1:bench", builder_factory=offline_builder)
+    # warm-up: one update per shard so every worker is up before timing
+    cluster.route(updates[:n_workers * 4], inboxes)
+    while done.value < n_workers * 4:
+        time.sleep(0.05)
+    body = updates[n_workers * 4:]
+    target = done.value + len(body)
+    t0 = time.perf_counter()
+    for i in range(0, len(body), 100):
+        cluster.route(body[i:i + 100], inboxes)
+    while done.value < target:
+        time.sleep(0.005)
+    dt = time.perf_counter() - t0
+    for inbox in inboxes:
+        inbox.put(None)
+    for p in procs:
+        p.join(timeout=30)
+    return len(body) / dt
+
+async def seed(users: int):
+    # schema + existing users, so timed runs measure the steady state, not first-contact
+    # inserts; claims are reset so every write-mix run does the same work
+    from db import db
+    await db.init()
+    await db.run_tx(lambda conn: conn.executemany("INSERT OR IGNORE INTO users(id, coins) VALUES(?, 200)",
+                                                  [(10_000 + u,) for u in range(users)]))
+    await db.run_tx(lambda conn: conn.execute("DELETE FROM user_quests"))
+    if not await db.fetchone("SELECT 1 FROM quests"):
+        await db.run_tx(lambda conn: conn.executemany(
+            "INSERT INTO quests(id, name, reward_coins, reward_exp, description) VALUES(?,?,?,?,?)",
+            [(q, f"q{q}", 10, 5, "bench") for q in (1, 2, 3)]))
+    await db.close()
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    os.chdir(tempfile.mkdtemp())
+    print(f"{os.cpu_count()} CPUs, {users} users")
+    for mix, commands in MIXES.items():
+        updates = make_updates(users, commands)
+        base = None
+        for n in sorted({1, *range(2, max_workers + 1, 2), max_workers}):
+            asyncio.run(seed(users))
+            rate = run_once(n, updates)
+            base = base or rate
+            print(f"{mix:<5}  workers={n:2d}  {rate:10.0f} cmds/s  speedup x{rate / base:.2f}")
+
+if __name__ == '__main__':
+    main()
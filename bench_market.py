@@ -0,0 +1,55 @@
+# bench_market.py — load benchmark for the market order book + settlement
+# usage: python bench_market.py [orders] [chars]
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from db import db
+from market import market
+
+async def run(n_orders: int, n_chars: int):
+    tmp = tempfile.mkdtemp()
+    db.path = os.path.join(tmp, "bench.db")
+    await db.init()
+    users = list(range(1, 201))
+    await db.conn.executemany("INSERT INTO users(id, coins) VALUES(?,?)", [(u, 10**9) for u in users])
+    await db.conn.executemany(
+        "INSERT INTO characters(id, name, rarity, faction, power, price) VALUES(?,?,?,?,?,?)",
+        [(c, f"C{c}", "Common", "X", 10, 100) for c in range(1, n_chars + 1)]
+    )
+    await db.conn.executemany(
+        "INSERT INTO inventory(user_id, char_id, count) VALUES(?,?,?)",
+        [(u, c, n_orders) for u in users for c in range(1, n_chars + 1)]
+    )
+    await db.conn.commit()
+    await market.load()
+
+    t0 = time.perf_counter()
+    for _ in range(n_orders):
+        await market.sell(random.choice(users), random.randint(1, n_chars), random.randint(50, 5000))
+    t_sell = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(n_orders * 10):
+        market.listing(random.randint(1, n_chars))
+    t_list = time.perf_counter() - t0
+
+    filled = 0
+    t0 = time.perf_counter()
+    for _ in range(n_orders):
+        status, _, _ = await market.buy(random.choice(users), random.randint(1, n_chars))
+        filled += status == "ok"
+    t_buy = time.perf_counter() - t0
+
+    print(f"orders={n_orders} chars={n_chars}")
+    print(f"sell:    {n_orders / t_sell:10.0f} orders/s")
+    print(f"listing: {n_orders * 10 / t_list:10.0f} queries/s (top 10)")
+    print(f"buy:     {n_orders / t_buy:10.0f} matches/s ({filled} filled)")
+    await db.close()
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    c = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(run(n, c))
@@ -0,0 +1,156 @@
+# cards.py — pre-rendered character cards keyed by character ID
+import os
+import sys
+from collections import OrderedDict
+from typing import Optional, Tuple, Any
+from telegram.error import BadRequest
+from db import db
+
+CARD_CACHE_BYTES = int(os.getenv("CARD_CACHE_BYTES", str(4 * 1024 * 1024)))
+
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "photo_sent": 0,
+    "photo_failed": 0,
+    "photo_skipped": 0,
+}
+
+class Character:
+    __slots__ = ("id", "name", "rarity", "faction", "power", "price", "file_id")
+
+    def __init__(self, id: int, name: str, rarity: str, faction: str, power: int, price: int, file_id: Optional[str]):
+        self.id = id
+        self.name = name
+        self.rarity = rarity
+        self.faction = faction
+        self.power = power
+        self.price = price
+        self.file_id = file_id
+
+    @classmethod
+    def from_row(cls, row: Tuple[Any, ...]) -> "Character":
+        # row: (id, name, rarity, faction, power, price, file_id)
+        return cls(*row[:7])
+
+def render_caption(c: Character) -> str:
+    return (
+        f"🆔 ID: {c.id}\n"
+        f"✨ Name: {c.name}\n"
+        f"⭐ Rarity: {c.rarity}\n"
+        f"🏹 Faction: {c.faction}\n"
+        f"💪 Power: {c.power}\n"
+        f"💰 Price: {c.price}"
+    )
+
+class Card:
+    __slots__ = ("char", "caption", "size")
+
+    def __init__(self, char: Character):
+        self.char = char
+        self.caption = render_caption(char)
+        self.size = (sys.getsizeof(self.caption) + sys.getsizeof(char.name or "")
+                     + sys.getsizeof(char.faction or "") + sys.getsizeof(char.file_id or "") + 160)
+
+class CardCache:
+    """LRU of rendered cards bounded by an approximate byte budget. file_ids that
+    failed to send are remembered separately so eviction doesn't bring retries back."""
+
+    def __init__(self, budget: int = CARD_CACHE_BYTES):
+        self.budget = budget
+        self.bytes = 0
+        self.cards: "OrderedDict[int, Card]" = OrderedDict()
+        self.bad_file_ids = set()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _put(self, card: Card) -> Card:
+        old = self.cards.pop(card.char.id, None)
+        if old is not None:
+            self.bytes -= old.size
+        self.cards[card.char.id] = card
+        self.bytes += card.size
+        while self.bytes > self.budget and len(self.cards) > 1:
+            _, ev = self.cards.popitem(last=False)
+            self.bytes -= ev.size
+            stats["evictions"] += 1
+        return card
+
+    def _hit(self, cid: int) -> Optional[Card]:
+        card = self.cards.get(cid)
+        if card is not None:
+            self.cards.move_to_end(cid)
+            stats["hits"] += 1
+        return card
+
+    def from_row(self, row: Tuple[Any, ...]) -> Card:
+        """Card for a row the caller already fetched (no DB round trip either way)."""
+        card = self._hit(row[0])
+        if card is None:
+            stats["misses"] += 1
+            card = self._put(Card(Character.from_row(row)))
+        return card
+
+    def preload(self, rows) -> int:
+        """Render cards for `rows` in order until the budget is full (startup warm-up,
+        not counted as misses). Returns how many were added."""
+        n = 0
+        for row in rows:
+            card = Card(Character.from_row(row))
+            if self.bytes + card.size > self.budget:
+                break
+            self._put(card)
+            n += 1
+        return n
+
+    async def get(self, cid: int) -> Optional[Card]:
+        card = self._hit(cid)
+        if card is not None:
+            return card
+        stats["misses"] += 1
+        row = await db.fetchone("SELECT id, name, rarity, faction, power, price, file_id FROM characters WHERE id=?", (cid,))
+        if not row:
+            return None
+        return self._put(Card(Character.from_row(row)))
+
+    def photo_usable(self, card: Card) -> bool:
+        return bool(card.char.file_id) and card.char.file_id not in self.bad_file_ids
+
+    def hit_rate(self) -> float:
+        total = stats["hits"] + stats["misses"]
+        return stats["hits"] / total if total else 0.0
+
+card_cache = CardCache()
+
+# BadRequest texts that blame the file itself; anything else (chat rights, chat not
+# found, caption too long, ...) says nothing about whether the file_id works elsewhere
+_FILE_ERRORS = ("file identifier", "file_id", "wrong type of the web page content", "failed to get http url content")
+
+def _is_file_error(e: BadRequest) -> bool:
+    msg = (e.message or "").lower()
+    return any(s in msg for s in _FILE_ERRORS)
+
+async def send_card(bot, chat_id: int, card: Card, header: str = "", reply_markup=None,
+                    text_fallback: bool = True) -> bool:
+    """Send the card as a photo when its file_id is usable, else as text (unless
+    text_fallback is off). Returns True if the photo went out."""
+    caption = header + card.caption
+    if card_cache.photo_usable(card):
+        try:
+            await bot.send_photo(chat_id=chat_id, photo=card.char.file_id, caption=caption, reply_markup=reply_markup)
+            stats["photo_sent"] += 1
+            return True
+        except BadRequest as e:
+            if _is_file_error(e):
+                # Telegram rejected the file_id itself; don't try it again anywhere
+                card_cache.bad_file_ids.add(card.char.file_id)
+            stats["photo_failed"] += 1
+        except Exception:
+            stats["photo_failed"] += 1
+    elif card.char.file_id:
+        stats["photo_skipped"] += 1
+    if text_fallback:
+        await bot.send_message(chat_id=chat_id, text=caption, reply_markup=reply_markup)
+    return False
@@ -0,0 +1,195 @@
+# cluster.py — scale-out mode: one ingress process, N worker processes sharded by user ID
+# Start with WORKERS=N python main.py. The ingress long-polls getUpdates and forwards
+# the raw update dicts; each worker decodes them and runs the normal handlers with its
+# own caches. Writers coordinate through SQLite's single write lock (db.run_tx takes
+# it with BEGIN IMMEDIATE, busy waits up to the connection timeout).
+import asyncio
+import multiprocessing as mp
+import os
+import signal
+import time
+import zlib
+from typing import List, Optional
+from telegram import Bot, Update
+
+# commands whose state lives in one process's memory (the market order book) go to shard 0
+GLOBAL_COMMANDS = {"sell", "buy", "orders", "cancelorder"}
+POLL_TIMEOUT = 30
+READY_TIMEOUT = 120
+STOP_TIMEOUT = 30
+
+def user_of(data: dict) -> Optional[int]:
+    for key in ("message", "edited_message", "callback_query", "inline_query", "my_chat_member", "chat_member"):
+        obj = data.get(key)
+        if obj and obj.get("from"):
+            return obj["from"]["id"]
+    return None
+
+def command_of(data: dict) -> Optional[str]:
+    text = (data.get("message") or {}).get("text") or ""
+    if text.startswith("/"):
+        return text.split()[0][1:].split("@")[0].lower()
+    return None
+
+def shard_of_user(uid: int, n: int) -> int:
+    # stable across processes and restarts (unlike hash())
+    return zlib.crc32(uid.to_bytes(8, "little", signed=True)) % n
+
+def shard_for(data: dict, n: int) -> int:
+    if command_of(data) in GLOBAL_COMMANDS:
+        return 0
+    uid = user_of(data)
+    if uid is None:
+        return 0
+    return shard_of_user(uid, n)
+
+async def _handle(app, data: dict, done):
+    update = Update.de_json(data, app.bot)
+    try:
+        await app.update_processor.process_update(update, app.process_update(update))
+    finally:
+        if done is not None:
+            with done.get_lock():
+                done.value += 1
+
+async def worker_loop(idx: int, inbox, done=None, token: str = None, builder=None,
+                      n: int = 1, ready=None):
+    """Run one shard: own DB connection, own caches, updates fed from `inbox`
+    as lists of raw update dicts; None stops it. `ready` is bumped once warm."""
+    from db import db
+    from main import build_app, shutdown
+    from startup import profile, warm_up
+    primary = idx == 0
+    with profile.phase("imports"):
+        app = build_app(token, primary=primary, builder=builder)
+    await warm_up(primary, shard=(idx, n))
+    loop = asyncio.get_running_loop()
+    # a SIGTERM sent to the worker itself stops it like the ingress would: after the
+    # batches already queued
+    loop.add_signal_handler(signal.SIGTERM, inbox.put, None)
+    tasks = set()
+    try:
+        async with app:
+            await app.start()
+            try:
+                print(f"[worker {idx}] startup:\n{profile.report()}", end="")
+                if ready is not None:
+                    with ready.get_lock():
+                        ready.value += 1
+                while True:
+                    batch = await loop.run_in_executor(None, inbox.get)
+                    if batch is None:
+                        break
+                    for data in batch:
+                        t = asyncio.create_task(_handle(app, data, done))
+                        tasks.add(t)
+                        t.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                await app.stop()
+                # post_shutdown only runs under run_polling/run_webhook; flush the buffers here
+                await shutdown(app)
+    finally:
+        await db.close()
+
+def _worker(idx: int, inbox, done=None, token: str = None, builder_factory=None, n: int = 1, ready=None):
+    # Ctrl+C reaches the whole process group; the ingress turns it into an orderly stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    builder = builder_factory() if builder_factory else None
+    asyncio.run(worker_loop(idx, inbox, done, token, builder, n, ready))
+
+def start_workers(n: int, done=None, token: str = None, builder_factory=None, ready=None):
+    ctx = mp.get_context("spawn")
+    inboxes = [ctx.Queue() for _ in range(n)]
+    procs = [ctx.Process(target=_worker, args=(i, inboxes[i], done, token, builder_factory, n, ready), daemon=True)
+             for i in range(n)]
+    for p in procs:
+        p.start()
+    return inboxes, procs
+
+def route(batch: List[dict], inboxes) -> None:
+    shards = [[] for _ in inboxes]
+    n = len(inboxes)
+    for data in batch:
+        shards[shard_for(data, n)].append(data)
+    for inbox, items in zip(inboxes, shards):
+        if items:
+            inbox.put(items)
+
+async def wait_ready(ready, n: int, timeout: float = READY_TIMEOUT, stop: asyncio.Event = None) -> bool:
+    """Block until all n workers finished warming up (or timeout, or stop is set)."""
+    deadline = time.monotonic() + timeout
+    while ready.value < n:
+        if stop is not None and stop.is_set():
+            return False
+        if time.monotonic() > deadline:
+            print(f"[cluster] only {ready.value}/{n} workers ready after {timeout}s, starting anyway")
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+async def ingress(token: str, inboxes, ready=None):
+    """Long-poll and route until SIGINT/SIGTERM. The caller then stops the workers."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    bot = Bot(token)
+    offset = 0
+    if ready is not None:
+        # updates stay queued at Telegram until every shard can answer them warm
+        t0 = time.monotonic()
+        if await wait_ready(ready, len(inboxes), stop=stop):
+            print(f"[cluster] workers ready in {time.monotonic() - t0:.2f}s")
+    async with bot:
+        stopping = asyncio.ensure_future(stop.wait())
+        while not stop.is_set():
+            poll = asyncio.ensure_future(bot.do_api_request(
+                "getUpdates", api_kwargs={"offset": offset, "timeout": POLL_TIMEOUT},
+                read_timeout=POLL_TIMEOUT + 10))
+            await asyncio.wait({poll, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            if not poll.done():
+                # unconfirmed updates are simply delivered again on the next start
+                poll.cancel()
+                break
+            try:
+                batch = poll.result()
+            except Exception as e:
+                print(f"[cluster] getUpdates failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if batch:
+                offset = batch[-1]["update_id"] + 1
+                route(batch, inboxes)
+        if offset:
+            # confirm what was routed so a restart doesn't receive it twice
+            try:
+                await bot.do_api_request("getUpdates", api_kwargs={"offset": offset, "timeout": 0})
+            except Exception as e:
+                print(f"[cluster] could not confirm offset {offset}: {e}")
+
+def run(n: int):
+    from db import db
+    from main import BOT_TOKEN
+
+    async def _migrate():
+        # apply migrations once, before any worker opens the file
+        await db.init()
+        await db.close()
+
+    asyncio.run(_migrate())
+    ready = mp.get_context("spawn").Value("i", 0)
+    inboxes, procs = start_workers(n, token=BOT_TOKEN, ready=ready)
+    print(f"Bot started (cluster: {n} workers, pid {os.getpid()})")
+    try:
+        asyncio.run(ingress(BOT_TOKEN, inboxes, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # workers finish what they were sent, then flush their buffers
+        for inbox in inboxes:
+            inbox.put(None)
+        for p in procs:
+            p.join(timeout=STOP_TIMEOUT)
+        print("Bot stopped")
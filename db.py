@@ -1,71 +1,222 @@
 import aiosqlite
+import asyncio
 import os
+import sqlite3
 import time
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Any, Optional
 
 DATA_DIR = "data"
 DB_FILE = os.path.join(DATA_DIR, "bot.db")
 BACKUP_DIR = "backups"
+# upper bounds for the per-connection mmap window and page cache (db.tune sizes both to the file)
+MMAP_MAX = int(os.getenv("SQLITE_MMAP_MAX_MB", "256")) << 20
+CACHE_MAX_KB = int(os.getenv("SQLITE_CACHE_MAX_MB", "64")) << 10
+
+class TxAbort(Exception):
+    """Raise inside a run_tx function to roll the transaction back with a status code."""
+
+    def __init__(self, status: str):
+        super().__init__(status)
+        self.status = status
+
+# Ordered schema migrations keyed by PRAGMA user_version. A step is an SQL script or a
+# fn(sqlite3_conn) for backfills; never edit a released step, append a new one instead.
+MIGRATIONS: List[Tuple[int, Any]] = [
+    (1, """
+    CREATE TABLE IF NOT EXISTS users(
+        id INTEGER PRIMARY KEY,
+        coins INTEGER DEFAULT 0,
+        level INTEGER DEFAULT 1,
+        exp INTEGER DEFAULT 0,
+        last_daily INTEGER DEFAULT 0,
+        last_battle INTEGER DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS characters(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        rarity TEXT,
+        faction TEXT,
+        power INTEGER,
+        price INTEGER,
+        file_id TEXT
+    );
+    CREATE TABLE IF NOT EXISTS inventory(
+        user_id INTEGER,
+        char_id INTEGER,
+        count INTEGER,
+        PRIMARY KEY(user_id,char_id)
+    );
+    CREATE TABLE IF NOT EXISTS admins(
+        user_id INTEGER PRIMARY KEY
+    );
+    CREATE TABLE IF NOT EXISTS quests(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        reward_coins INTEGER DEFAULT 0,
+        reward_exp INTEGER DEFAULT 0,
+        description TEXT
+    );
+    CREATE TABLE IF NOT EXISTS user_quests(
+        user_id INTEGER,
+        quest_id INTEGER,
+        done INTEGER DEFAULT 0,
+        PRIMARY KEY(user_id, quest_id)
+    );
+    CREATE TABLE IF NOT EXISTS market_orders(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        seller_id INTEGER,
+        char_id INTEGER,
+        price INTEGER,
+        created_at INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS purchases(
+        token TEXT PRIMARY KEY,
+        user_id INTEGER,
+        char_id INTEGER,
+        price INTEGER,
+        created_at INTEGER
+    );
+    """),
+    (2, """
+    CREATE INDEX IF NOT EXISTS idx_users_rank ON users(level DESC, exp DESC, coins DESC);
+    CREATE INDEX IF NOT EXISTS idx_characters_rarity ON characters(rarity);
+    CREATE INDEX IF NOT EXISTS idx_characters_name ON characters(name);
+    CREATE INDEX IF NOT EXISTS idx_user_quests_done ON user_quests(user_id, done, quest_id);
+    CREATE INDEX IF NOT EXISTS idx_user_quests_quest ON user_quests(quest_id);
+    CREATE INDEX IF NOT EXISTS idx_purchases_created ON purchases(created_at);
+    """),
+    (3, """
+    CREATE TABLE IF NOT EXISTS coin_ledger(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        delta INTEGER,
+        balance INTEGER,
+        reason TEXT,
+        ref TEXT,
+        created_at INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_coin_ledger_user ON coin_ledger(user_id, delta);
+    CREATE INDEX IF NOT EXISTS idx_coin_ledger_created ON coin_ledger(created_at);
+    INSERT INTO coin_ledger(user_id, delta, balance, reason, ref, created_at)
+        SELECT id, coins, coins, 'opening', NULL, CAST(strftime('%s', 'now') AS INTEGER) FROM users WHERE coins != 0;
+    """),
+    (4, """
+    CREATE TABLE IF NOT EXISTS summon_log(
+        id INTEGER PRIMARY KEY,
+        ts INTEGER,
+        user_id INTEGER,
+        char_id INTEGER,
+        rarity INTEGER,
+        cost INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS summon_hourly(
+        hour INTEGER,
+        rarity INTEGER,
+        pulls INTEGER DEFAULT 0,
+        PRIMARY KEY(hour, rarity)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS summon_hourly_econ(
+        hour INTEGER PRIMARY KEY,
+        pulls INTEGER DEFAULT 0,
+        coins_spent INTEGER DEFAULT 0,
+        unique_users INTEGER DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS summon_hour_users(
+        hour INTEGER,
+        user_id INTEGER,
+        PRIMARY KEY(hour, user_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS summon_totals(
+        rarity INTEGER PRIMARY KEY,
+        pulls INTEGER DEFAULT 0
+    );
+    """),
+]
+
+def _apply_migration(conn: sqlite3.Connection, version: int, step: Any):
+    # runs on the writer thread; BEGIN IMMEDIATE takes the write lock up front so the
+    # step cannot half-apply, and the version bump is part of the same transaction
+    if conn.in_transaction:
+        conn.commit()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # another process may have applied it while we waited for the lock
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            conn.rollback()
+            return
+        if callable(step):
+            step(conn)
+        else:
+            for stmt in _split_sql(step):
+                conn.execute(stmt)
+        conn.execute(f"PRAGMA user_version={int(version)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _split_sql(script: str) -> List[str]:
+    stmts, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            stmts.append(buf.strip())
+            buf = ""
+    if buf.strip():
+        stmts.append(buf.strip())
+    return stmts
 
 class DB:
     def __init__(self, path: str = DB_FILE):
         os.makedirs(DATA_DIR, exist_ok=True)
         os.makedirs(BACKUP_DIR, exist_ok=True)
         self.path = path
+        # reads go through aiosqlite; every write unit runs on one dedicated connection
+        # owned by a single thread, so units never interleave and a rollback only
+        # ever undoes its own statements
         self.conn: Optional[aiosqlite.Connection] = None
+        self.writer: Optional[sqlite3.Connection] = None
+        self._write_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
 
     async def init(self):
+        await self._open()
+        await self._migrate()
+
+    async def _open(self):
         self.conn = await aiosqlite.connect(self.path)
+        # only takes effect on a fresh file (before WAL writes the header); maintenance converts older ones
+        await self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
         await self.conn.execute("PRAGMA journal_mode=WAL;")
         await self.conn.execute("PRAGMA synchronous=NORMAL;")
-        await self._migrate()
+        self.writer = await self._on_writer(self._open_writer)
+
+    def _open_writer(self) -> sqlite3.Connection:
+        # autocommit mode: transactions are opened explicitly by run_tx
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
+
+    async def _on_writer(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._write_thread, fn, *args)
+
+    async def close(self):
+        await self.conn.close()
+        if self.writer is not None:
+            await self._on_writer(self.writer.close)
+            self.writer = None
 
     async def _migrate(self):
-        """Create tables if not exist (idempotent)."""
-        script = """
-        CREATE TABLE IF NOT EXISTS users(
-            id INTEGER PRIMARY KEY,
-            coins INTEGER DEFAULT 0,
-            level INTEGER DEFAULT 1,
-            exp INTEGER DEFAULT 0,
-            last_daily INTEGER DEFAULT 0,
-            last_battle INTEGER DEFAULT 0
-        );
-        CREATE TABLE IF NOT EXISTS characters(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            rarity TEXT,
-            faction TEXT,
-            power INTEGER,
-            price INTEGER,
-            file_id TEXT
-        );
-        CREATE TABLE IF NOT EXISTS inventory(
-            user_id INTEGER,
-            char_id INTEGER,
-            count INTEGER,
-            PRIMARY KEY(user_id,char_id)
-        );
-        CREATE TABLE IF NOT EXISTS admins(
-            user_id INTEGER PRIMARY KEY
-        );
-        CREATE TABLE IF NOT EXISTS quests(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            reward_coins INTEGER DEFAULT 0,
-            reward_exp INTEGER DEFAULT 0,
-            description TEXT
-        );
-        CREATE TABLE IF NOT EXISTS user_quests(
-            user_id INTEGER,
-            quest_id INTEGER,
-            done INTEGER DEFAULT 0,
-            PRIMARY KEY(user_id, quest_id)
-        );
-        """
-        await self.conn.executescript(script)
-        await self.conn.commit()
+        """Apply pending MIGRATIONS in order; each step and its user_version bump commit together."""
+        for version, step in await self.pending_migrations():
+            await self._on_writer(_apply_migration, self.writer, version, step)
+
+    async def pending_migrations(self) -> List[Tuple[int, Any]]:
+        """Migrations newer than PRAGMA user_version (dry run: nothing is applied)."""
+        row = await self.fetchone("PRAGMA user_version")
+        current = row[0] if row else 0
+        return [(v, step) for v, step in MIGRATIONS if v > current]
 
     async def fetchone(self, query: str, params: Tuple = ()):
         cur = await self.conn.execute(query, params)
@@ -80,23 +231,65 @@ class DB:
         return rows
 
     async def execute(self, query: str, params: Tuple = (), commit: bool = False):
-        cur = await self.conn.execute(query, params)
+        """With commit, the statement is its own write unit on the writer connection;
+        without, it runs on the read connection (PRAGMAs and the like)."""
         if commit:
-            await self.conn.commit()
-        return cur
+            return await self.run_tx(lambda conn: conn.execute(query, params))
+        return await self.conn.execute(query, params)
+
+    async def run_tx(self, fn, *args):
+        """Run fn(sqlite3_conn, *args) as a single transaction on the writer thread.
+        Nothing else reaches the writer connection until it commits or rolls back."""
+        def _tx(*a):
+            conn = self.writer
+            try:
+                # take the write lock up front: with several processes on one file a
+                # deferred read->write upgrade can fail with SQLITE_BUSY instead of waiting
+                conn.execute("BEGIN IMMEDIATE")
+                res = fn(conn, *a)
+                conn.execute("COMMIT")
+                return res
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        return await self._on_writer(_tx, *args)
+
+    async def run_read(self, fn, *args):
+        """Run fn(sqlite3_conn, *args) on the writer thread without opening a transaction."""
+        return await self._on_writer(fn, self.writer, *args)
+
+    async def tune(self) -> Tuple[int, int, int]:
+        """Size mmap and the page cache to the database file, capped by MMAP_MAX and
+        CACHE_MAX_KB. Returns (db_bytes, mmap_bytes, cache_kb)."""
+        page_size = (await self.fetchone("PRAGMA page_size"))[0]
+        pages = (await self.fetchone("PRAGMA page_count"))[0]
+        size = page_size * pages
+        # 2x leaves room to grow until the next restart; mmap pages are shared by worker processes
+        mmap = min(MMAP_MAX, max(size * 2, 16 << 20))
+        cache_kb = min(CACHE_MAX_KB, max(size * 2 // 1024, 2000))
+        for stmt in (f"PRAGMA mmap_size={mmap}", f"PRAGMA cache_size=-{cache_kb}"):
+            await self.conn.execute(stmt)
+            await self._on_writer(self.writer.execute, stmt)
+        return size, mmap, cache_kb
 
     async def backup(self) -> Optional[str]:
+        """Online backup through a separate connection in a worker thread, so the
+        bot's connections keep serving requests while pages are copied."""
+        def _copy(src_path: str, dst_path: str):
+            src = sqlite3.connect(src_path)
+            dst = sqlite3.connect(dst_path)
+            try:
+                src.backup(dst, pages=256, sleep=0.005)
+            finally:
+                dst.close()
+                src.close()
         try:
             timestamp = time.strftime("%Y%m%d_%H%M%S")
             backup_file = os.path.join(BACKUP_DIR, f"bot_{timestamp}.db")
             # Make sure writes are flushed
             await self.conn.commit()
-            self.conn.close()
-            shutil.copy(self.path, backup_file)
-            # reopen
-            self.conn = await aiosqlite.connect(self.path)
-            await self.conn.execute("PRAGMA journal_mode=WAL;")
-            await self.conn.execute("PRAGMA synchronous=NORMAL;")
+            await asyncio.to_thread(_copy, self.path, backup_file)
             return backup_file
         except Exception:
             return None
@@ -111,14 +304,36 @@ class DB:
             return False
         last = os.path.join(BACKUP_DIR, files[-1])
         try:
-            self.conn.close()
+            await self.close()
         except Exception:
             pass
         shutil.copy(last, self.path)
-        self.conn = await aiosqlite.connect(self.path)
-        await self.conn.execute("PRAGMA journal_mode=WAL;")
-        await self.conn.execute("PRAGMA synchronous=NORMAL;")
+        await self._open()
+        await self.tune()
         return True
 
+class Snapshot:
+    """A small table held in memory as loader(sqlite3_conn) -> value. Reloaded on the
+    first get() after `ttl` seconds or invalidate(); other worker processes pick up
+    changes within ttl."""
+
+    def __init__(self, loader, ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self.value = None
+        self.loaded_at = 0.0
+
+    async def get(self):
+        if self.value is None or time.monotonic() - self.loaded_at > self.ttl:
+            self.set(await db.run_read(self.loader))
+        return self.value
+
+    def set(self, value):
+        self.value = value
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.value = None
+
 # single global db instance (import and await db.init() at startup)
 db = DB()
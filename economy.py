@@ -0,0 +1,194 @@
+# economy.py — every coin movement goes through here
+# debit/credit/transfer are one conditional UPDATE ... RETURNING on the writer thread;
+# each movement is then appended to coin_ledger through a batched writer.
+import asyncio
+import os
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+from telegram.ext import ContextTypes, JobQueue
+from db import db, TxAbort
+
+LEDGER_BATCH = 200
+LEDGER_FLUSH_INTERVAL = 2
+LEDGER_KEEP_DAYS = int(os.getenv("LEDGER_KEEP_DAYS", "30"))
+COMPACT_INTERVAL = 86400
+RECONCILE_INTERVAL = int(os.getenv("RECONCILE_INTERVAL", "3600"))
+
+stats = {
+    "debits": 0,
+    "credits": 0,
+    "transfers": 0,
+    "insufficient": 0,
+    "ledger_written": 0,
+    "ledger_compacted": 0,
+    "reconcile_runs": 0,
+    "reconcile_drift": 0,
+}
+drift: List[Tuple[int, int, int]] = []
+
+class LedgerWriter:
+    """Buffers ledger rows and writes them with one executemany per batch."""
+
+    def __init__(self):
+        self.buf: List[tuple] = []
+        self.lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.buf)
+
+    def add(self, user_id: int, delta: int, balance: Optional[int], reason: str, ref: Optional[str] = None):
+        self.buf.append((user_id, delta, balance, reason, ref, int(time.time())))
+        if len(self.buf) >= LEDGER_BATCH and not self.lock.locked():
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        async with self.lock:
+            if not self.buf:
+                return
+            rows, self.buf = self.buf, []
+            try:
+                await db.run_tx(_tx_ledger, rows)
+            except Exception:
+                # keep them for the next flush
+                self.buf = rows + self.buf
+                raise
+            stats["ledger_written"] += len(rows)
+
+ledger = LedgerWriter()
+
+def _tx_ledger(conn, rows: List[tuple]):
+    conn.executemany(
+        "INSERT INTO coin_ledger(user_id, delta, balance, reason, ref, created_at) VALUES(?,?,?,?,?,?)",
+        rows
+    )
+
+# Transaction-level building blocks for other modules' run_tx functions. Once the
+# transaction has committed, the caller reports the movement with record() /
+# record_transfer() (or record_declined() when it was refused).
+
+def debit_tx(conn, user_id: int, amount: int) -> Optional[int]:
+    row = conn.execute("UPDATE users SET coins = coins - ? WHERE id=? AND coins >= ? RETURNING coins",
+                       (amount, user_id, amount)).fetchone()
+    return row[0] if row else None
+
+def credit_tx(conn, user_id: int, amount: int) -> Optional[int]:
+    row = conn.execute("UPDATE users SET coins = coins + ? WHERE id=? RETURNING coins", (amount, user_id)).fetchone()
+    return row[0] if row else None
+
+def transfer_tx(conn, from_id: int, to_id: int, amount: int) -> Tuple[int, int]:
+    src = debit_tx(conn, from_id, amount)
+    if src is None:
+        raise TxAbort("no_coins")
+    dst = credit_tx(conn, to_id, amount)
+    if dst is None:
+        raise TxAbort("no_user")
+    return src, dst
+
+def record(user_id: int, delta: int, balance: Optional[int], reason: str, ref: Optional[str] = None):
+    """Count a committed debit (delta < 0) or credit and queue its ledger row."""
+    stats["debits" if delta < 0 else "credits"] += 1
+    ledger.add(user_id, delta, balance, reason, ref)
+
+def record_transfer(from_id: int, to_id: int, amount: int, balances: Tuple[int, int], reason: str,
+                    ref: Optional[str] = None):
+    stats["transfers"] += 1
+    ledger.add(from_id, -amount, balances[0], reason, ref)
+    ledger.add(to_id, amount, balances[1], reason, ref)
+
+def record_declined():
+    stats["insufficient"] += 1
+
+async def debit(user_id: int, amount: int, reason: str, ref: Optional[str] = None) -> Optional[int]:
+    """Take `amount` coins if the balance covers it. Returns the new balance, or None."""
+    bal = await db.run_tx(debit_tx, user_id, amount)
+    if bal is None:
+        record_declined()
+        return None
+    record(user_id, -amount, bal, reason, ref)
+    return bal
+
+async def credit(user_id: int, amount: int, reason: str, ref: Optional[str] = None) -> Optional[int]:
+    """Add coins. Returns the new balance, or None if the user doesn't exist."""
+    bal = await db.run_tx(credit_tx, user_id, amount)
+    if bal is None:
+        return None
+    record(user_id, amount, bal, reason, ref)
+    return bal
+
+async def transfer(from_id: int, to_id: int, amount: int, reason: str, ref: Optional[str] = None) -> Optional[Tuple[int, int]]:
+    """Move coins atomically. Returns (from_balance, to_balance), or None if it can't."""
+    try:
+        balances = await db.run_tx(transfer_tx, from_id, to_id, amount)
+    except TxAbort:
+        record_declined()
+        return None
+    record_transfer(from_id, to_id, amount, balances, reason, ref)
+    return balances
+
+def _tx_compact(conn, cutoff: int) -> int:
+    # collapse old rows into one 'compact' row per user, stamped at the cutoff so the
+    # next run folds it in again; per-user sums (and so reconciliation) are unchanged
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM coin_ledger WHERE created_at < ?", (cutoff,)).fetchone()[0]
+    if not max_id:
+        return 0
+    conn.execute(
+        "INSERT INTO coin_ledger(user_id, delta, balance, reason, ref, created_at) "
+        "SELECT user_id, SUM(delta), NULL, 'compact', NULL, ? FROM coin_ledger "
+        "WHERE created_at < ? AND id <= ? GROUP BY user_id",
+        (cutoff, cutoff, max_id)
+    )
+    return conn.execute("DELETE FROM coin_ledger WHERE created_at < ? AND id <= ?", (cutoff, max_id)).rowcount
+
+def _snapshot_drift(path: str) -> List[Tuple[int, int, int]]:
+    # separate read-only connection: under WAL it reads one consistent snapshot of
+    # users + coin_ledger without taking any lock the bot's writer would wait on
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute(
+            "SELECT u.id, u.coins, COALESCE(l.total, 0) FROM users u "
+            "LEFT JOIN (SELECT user_id, SUM(delta) AS total FROM coin_ledger GROUP BY user_id) l ON l.user_id = u.id "
+            "WHERE u.coins != COALESCE(l.total, 0)"
+        ).fetchall()
+    finally:
+        conn.close()
+
+async def reconcile() -> List[Tuple[int, int, int]]:
+    """(user_id, coins, ledger_sum) for every user whose balance disagrees with the ledger.
+    Users that only differ because of rows still in flight are re-checked after a flush."""
+    await ledger.flush()
+    suspects = await asyncio.to_thread(_snapshot_drift, db.path)
+    if suspects:
+        # other worker processes flush on their own LEDGER_FLUSH_INTERVAL
+        await asyncio.sleep(LEDGER_FLUSH_INTERVAL * 2)
+        await ledger.flush()
+        again = await asyncio.to_thread(_snapshot_drift, db.path)
+        ids = {r[0] for r in suspects}
+        suspects = [r for r in again if r[0] in ids]
+    stats["reconcile_runs"] += 1
+    stats["reconcile_drift"] = len(suspects)
+    drift[:] = suspects[:20]
+    return suspects
+
+async def flush_job(context: ContextTypes.DEFAULT_TYPE):
+    await ledger.flush()
+
+async def compact_job(context: ContextTypes.DEFAULT_TYPE):
+    await ledger.flush()
+    cutoff = int(time.time()) - LEDGER_KEEP_DAYS * 86400
+    stats["ledger_compacted"] += await db.run_tx(_tx_compact, cutoff)
+
+async def reconcile_job(context: ContextTypes.DEFAULT_TYPE):
+    rows = await reconcile()
+    for uid, coins, total in rows[:20]:
+        print(f"[economy] drift user={uid} coins={coins} ledger={total}")
+
+def schedule(job_queue: JobQueue, primary: bool = True):
+    job_queue.run_repeating(flush_job, LEDGER_FLUSH_INTERVAL, first=LEDGER_FLUSH_INTERVAL, name="ledger_flush")
+    if not primary:
+        return
+    job_queue.run_repeating(compact_job, COMPACT_INTERVAL, first=3600, name="ledger_compact")
+    job_queue.run_repeating(reconcile_job, RECONCILE_INTERVAL, first=600, name="ledger_reconcile")
+
+async def shutdown(app=None):
+    await ledger.flush()
@@ -2,7 +2,14 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from db import db
-from utils import is_admin, is_owner, init_user
+from utils import is_admin, is_owner, init_user, catalog
+import idempotency
+import ratelimit
+import maintenance
+import economy
+from summon_log import summon_log, format_stats
+import cards
+import startup
 
 async def addadmin_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
@@ -67,7 +74,7 @@ async def addcoins_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if amount <= 0:
         await update.message.reply_text("❌ Amount must be > 0")
         return
-    await db.execute("UPDATE users SET coins = coins + ? WHERE id=?", (amount, target), commit=True)
+    await economy.credit(target, amount, "admin", str(admin))
     await update.message.reply_text(f"✅ Added {amount} coins to {update.message.reply_to_message.from_user.first_name}")
 
 async def upload_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -128,4 +135,63 @@ async def upload_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # try to fetch last id
     row = await db.fetchone("SELECT id FROM characters WHERE name=? ORDER BY id DESC LIMIT 1", (name,))
     new_id = row[0] if row else None
+    # characters are only ever inserted (fresh AUTOINCREMENT id), so no cached card
+    # can be stale; only the catalog needs reloading to include the new one
+    catalog.invalidate()
     await update.message.reply_text(f"✅ Uploaded! ID: {new_id} | Name: {name}")
+
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin(update.effective_user.id):
+        await update.message.reply_text("⚠ Admin only")
+        return
+    st = await summon_log.stats()
+    await update.message.reply_text(format_stats(st))
+
+async def vacuum_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin(update.effective_user.id):
+        await update.message.reply_text("⚠ Admin only")
+        return
+    await update.message.reply_text("🧹 VACUUM running... (writes wait until it finishes)")
+    try:
+        detail = await maintenance.full_vacuum()
+    except Exception as e:
+        await update.message.reply_text(f"❌ VACUUM failed: {e}")
+        return
+    await update.message.reply_text(f"✅ VACUUM done: {detail}")
+
+async def metrics_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin(update.effective_user.id):
+        await update.message.reply_text("⚠ Admin only")
+        return
+    st = idempotency.stats
+    shed = st["duplicates"] + st["purchase_replays"]
+    text = (
+        "📈 Metrics\n\n"
+        f"🔁 Callbacks: {st['callbacks']}\n"
+        f"   duplicates shed: {st['duplicates']} (in-flight: {st['inflight_duplicates']})\n"
+        f"   purchase replays blocked: {st['purchase_replays']}\n"
+        f"   total shed: {shed} | cache size: {len(idempotency.callback_cache)}\n"
+    )
+    rl = ratelimit.stats
+    text += (
+        f"\n🚦 Rate limit: allowed {rl['allowed']} | limited {rl['limited']}\n"
+        f"   buckets: {rl['buckets']} (evicted {rl['evicted']})\n"
+        f"   low-prio queued {rl['queued']} | shed {rl['shed']} | peak active {rl['peak_active']}\n"
+    )
+    text += "\n🧹 DB maintenance:\n" + maintenance.report()
+    ec = economy.stats
+    text += (
+        f"\n💰 Economy: debits {ec['debits']} | credits {ec['credits']} | transfers {ec['transfers']}"
+        f" | insufficient {ec['insufficient']}\n"
+        f"   ledger written {ec['ledger_written']} (pending {len(economy.ledger)}) | compacted {ec['ledger_compacted']}\n"
+        f"   reconcile runs {ec['reconcile_runs']} | drifting users {ec['reconcile_drift']}\n"
+    )
+    cs = cards.stats
+    text += (
+        f"\n🃏 Card cache: {len(cards.card_cache)} cards, {cards.card_cache.bytes // 1024}KB"
+        f" / {cards.card_cache.budget // 1024}KB | hit rate {cards.card_cache.hit_rate() * 100:.1f}%\n"
+        f"   hits {cs['hits']} | misses {cs['misses']} | evicted {cs['evictions']}\n"
+        f"   photos sent {cs['photo_sent']} | failed {cs['photo_failed']} | skipped (bad file_id) {cs['photo_skipped']}\n"
+    )
+    text += "\n🚀 Startup:\n" + startup.profile.report()
+    await update.message.reply_text(text)
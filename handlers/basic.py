@@ -12,6 +12,9 @@ START_TEXT = (
     "/summon10 - Summon x10\n"
     "/store - ဆိုင်\n"
     "/inventory - အိတ်\n"
+    "/sell - Market တွင်ရောင်းရန်\n"
+    "/buy - Market မှဝယ်ရန်\n"
+    "/orders - ရောင်းနေသော Order များ\n"
     "/daily - နေ့စဉ်ဆု\n"
     "/balance - ငွေစစ်ရန်\n"
     "/tops - အဆင့်\n"
@@ -3,11 +3,18 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from db import db
 from utils import init_user, get_total_power, battle_animation, add_exp, get_user_name
+import economy
 import time
 import random
 
 BATTLE_CD = 600
 
+def _tx_start_cooldown(conn, uid: int, now: int) -> bool:
+    # conditional write: of two concurrent /battle commands only one gets the slot
+    cur = conn.execute("UPDATE users SET last_battle=? WHERE id=? AND COALESCE(last_battle, 0) <= ?",
+                       (now, uid, now - BATTLE_CD))
+    return cur.rowcount == 1
+
 async def battle_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     await init_user(uid)
@@ -43,6 +50,9 @@ async def battle_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if my_power == 0 or enemy_power == 0:
         await update.message.reply_text("⚠ တိုက်ရန် characters မရှိသေးပါ")
         return
+    if not await db.run_tx(_tx_start_cooldown, uid, now):
+        await update.message.reply_text(f"⏱ {BATTLE_CD//60} မိနစ်နောက်မှ ပြန်တိုက်ပါ")
+        return
     me_name = update.effective_user.first_name or str(uid)
     enemy_name = await get_user_name(context.bot, enemy_id)
     try:
@@ -60,8 +70,8 @@ async def battle_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         loser = enemy_id if winner == uid else uid
         win_name = me_name if winner == uid else enemy_name
     reward = random.randint(80, 150)
-    await db.execute("UPDATE users SET coins=coins+?, last_battle=? WHERE id=?", (reward, now, winner), commit=True)
-    await db.execute("UPDATE users SET last_battle=? WHERE id=?", (now, loser), commit=True)
+    await economy.credit(winner, reward, "battle", str(loser))
+    await db.execute("UPDATE users SET last_battle=? WHERE id IN (?,?)", (now, winner, loser), commit=True)
     await add_exp(winner, 40); await add_exp(loser, 15)
     final_text = (
         f"🏆 BATTLE RESULT 🏆\n\n"
@@ -3,12 +3,13 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from db import db
 from utils import init_user
+from idempotency import dedup_callback
 
 INV_PAGE = 8
 
 async def build_inventory_pages(uid: int):
     rows = await db.fetchall(
-        "SELECT characters.id, characters.name, characters.rarity, inventory.count FROM inventory JOIN characters ON inventory.char_id=characters.id WHERE inventory.user_id=? ORDER BY characters.id",
+        "SELECT characters.id, characters.name, characters.rarity, inventory.count FROM inventory JOIN characters ON inventory.char_id=characters.id WHERE inventory.user_id=? ORDER BY inventory.char_id",
         (uid,)
     ) or []
     pages = [rows[i:i+INV_PAGE] for i in range(0, len(rows), INV_PAGE)]
@@ -40,6 +41,7 @@ async def inventory_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     await send_inventory_page(update.effective_chat.id, context, pages, 0)
 
+@dedup_callback
 async def inv_btn(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
@@ -0,0 +1,91 @@
+# handlers/market.py
+from telegram import Update
+from telegram.ext import ContextTypes
+from db import db
+from utils import init_user
+from market import market, MAX_PRICE
+
+async def sell_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uid = update.effective_user.id
+    await init_user(uid)
+    if len(context.args) != 2:
+        await update.message.reply_text("Usage: /sell <char_id> <price>")
+        return
+    try:
+        cid = int(context.args[0]); price = int(context.args[1])
+    except Exception:
+        await update.message.reply_text("char_id နှင့် price သည် ဂဏန်းဖြစ်ရပါမယ်")
+        return
+    if price <= 0 or price > MAX_PRICE:
+        await update.message.reply_text(f"❌ Price must be 1-{MAX_PRICE}")
+        return
+    status, order = await market.sell(uid, cid, price)
+    if status == "no_item":
+        await update.message.reply_text("❌ ဒီ Character ကို သင့် Inventory ထဲမှာ မရှိပါ")
+        return
+    await update.message.reply_text(f"✅ Listed! Order ID: {order.id} | Char ID: {cid} | Price: {price}")
+
+async def buy_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uid = update.effective_user.id
+    await init_user(uid)
+    if len(context.args) not in (1, 2):
+        await update.message.reply_text("Usage: /buy <char_id> [max_price]")
+        return
+    try:
+        cid = int(context.args[0])
+        max_price = int(context.args[1]) if len(context.args) == 2 else None
+    except Exception:
+        await update.message.reply_text("char_id နှင့် price သည် ဂဏန်းဖြစ်ရပါမယ်")
+        return
+    status, order, coins = await market.buy(uid, cid, max_price)
+    if status == "no_orders":
+        await update.message.reply_text("📭 ဒီ Character အတွက် ရောင်းသူမရှိသေးပါ")
+    elif status == "too_expensive":
+        await update.message.reply_text(f"❌ Cheapest offer is {order.price} coins")
+    elif status == "no_coins":
+        await update.message.reply_text("❌ Coins မလုံလောက်ပါ")
+    elif status == "gone":
+        await update.message.reply_text("⚠ Order was just taken, try again")
+    elif status != "ok":
+        await update.message.reply_text("⚠ Order could not be filled")
+    else:
+        row = await db.fetchone("SELECT name, rarity FROM characters WHERE id=?", (cid,))
+        name = f"{row[0]} ({row[1]})" if row else f"ID:{cid}"
+        await update.message.reply_text(f"✅ Successfully Bought!\n\n📦 {name}\n💰 Paid: {order.price} | Coins: {coins}")
+
+async def orders_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if len(context.args) != 1:
+        await update.message.reply_text("Usage: /orders <char_id>")
+        return
+    try:
+        cid = int(context.args[0])
+    except Exception:
+        await update.message.reply_text("Invalid char_id")
+        return
+    orders = market.listing(cid)
+    if not orders:
+        await update.message.reply_text("📭 ဒီ Character အတွက် ရောင်းသူမရှိသေးပါ")
+        return
+    text = f"🏪 Market — Char ID:{cid}\n\n"
+    for i, o in enumerate(orders, 1):
+        text += f"{i}. 💰 {o.price} — Order:{o.id}\n"
+    text += "\nဝယ်ရန်: /buy <char_id> [max_price]"
+    await update.message.reply_text(text)
+
+async def cancelorder_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uid = update.effective_user.id
+    if len(context.args) != 1:
+        await update.message.reply_text("Usage: /cancelorder <order_id>")
+        return
+    try:
+        oid = int(context.args[0])
+    except Exception:
+        await update.message.reply_text("Invalid order_id")
+        return
+    status, order = await market.cancel(uid, oid)
+    if status == "ok":
+        await update.message.reply_text(f"✅ Order {oid} cancelled, character returned to inventory")
+    elif status == "not_owner":
+        await update.message.reply_text("⚠ ဒီ Order က သင့်ဟာမဟုတ်ပါ")
+    else:
+        await update.message.reply_text("Order မတွေ့ပါ")
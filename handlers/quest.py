@@ -1,8 +1,32 @@
 # handlers/quest.py
+import os
 from telegram import Update
 from telegram.ext import ContextTypes
-from db import db
+from typing import Optional, Tuple
+from db import db, Snapshot, TxAbort
 from utils import init_user, add_exp
+import economy
+
+def load_quests(conn) -> list:
+    return conn.execute("SELECT id, name, reward_coins, reward_exp, description FROM quests").fetchall()
+
+# listing only; /claim still reads the quest row so a deleted quest can't pay out
+quest_catalog = Snapshot(load_quests, int(os.getenv("QUESTS_TTL", "60")))
+
+def _tx_claim(conn, uid: int, qid: int) -> Optional[Tuple[int, int, int]]:
+    # marking the quest done and paying the reward commit together; a second
+    # claim finds done=1, changes no row and pays nothing
+    q = conn.execute("SELECT reward_coins, reward_exp FROM quests WHERE id=?", (qid,)).fetchone()
+    if not q:
+        return None
+    cur = conn.execute("INSERT INTO user_quests(user_id, quest_id, done) VALUES(?,?,1) "
+                       "ON CONFLICT(user_id, quest_id) DO UPDATE SET done=1 WHERE done=0", (uid, qid))
+    if cur.rowcount == 0:
+        raise TxAbort("claimed")
+    bal = economy.credit_tx(conn, uid, q[0])
+    if bal is None:
+        raise TxAbort("no_user")
+    return q[0], q[1], bal
 
 async def createquest_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
@@ -22,6 +46,7 @@ async def createquest_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Coins နှင့် Exp သည် ဂဏန်းဖြစ်ရပါမယ်")
         return
     await db.execute("INSERT INTO quests(name, reward_coins, reward_exp, description) VALUES(?,?,?,?)", (name, coins, expv, desc), commit=True)
+    quest_catalog.invalidate()
     await update.message.reply_text("✅ Quest created")
 
 async def delquest_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -36,12 +61,13 @@ async def delquest_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     await db.execute("DELETE FROM quests WHERE id=?", (qid,), commit=True)
     await db.execute("DELETE FROM user_quests WHERE quest_id=?", (qid,), commit=True)
+    quest_catalog.invalidate()
     await update.message.reply_text("✅ Quest deleted (if existed)")
 
 async def quest_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     await init_user(uid)
-    rows = await db.fetchall("SELECT id, name, reward_coins, reward_exp, description FROM quests") or []
+    rows = await quest_catalog.get()
     if not rows:
         await update.message.reply_text("📜 Quest မရှိသေးပါ")
         return
@@ -66,17 +92,17 @@ async def claim_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         await update.message.reply_text("Invalid quest_id")
         return
-    q = await db.fetchone("SELECT reward_coins, reward_exp FROM quests WHERE id=?", (qid,))
-    if not q:
-        await update.message.reply_text("Quest မတွေ့ပါ")
+    try:
+        res = await db.run_tx(_tx_claim, uid, qid)
+    except TxAbort as e:
+        if e.status == "claimed":
+            await update.message.reply_text("❌ သင်သည် ဒီ Quest ကို ရယူပြီးသားဖြစ်သည်")
         return
-    row = await db.fetchone("SELECT done FROM user_quests WHERE user_id=? AND quest_id=?", (uid, qid))
-    if row and row[0] == 1:
-        await update.message.reply_text("❌ သင်သည် ဒီ Quest ကို ရယူပြီးသားဖြစ်သည်")
+    if res is None:
+        await update.message.reply_text("Quest မတွေ့ပါ")
         return
-    await db.execute("INSERT OR REPLACE INTO user_quests(user_id, quest_id, done) VALUES(?,?,1)", (uid, qid, 1), commit=True)
-    coins, expv = q
-    await db.execute("UPDATE users SET coins = coins + ? WHERE id=?", (coins, uid), commit=True)
+    coins, expv, bal = res
+    economy.record(uid, coins, bal, "quest", str(qid))
     leveled, new_lvl = await add_exp(uid, expv)
     msg = f"🎉 Quest claimed! +{coins} coins, +{expv} EXP"
     if leveled:
@@ -1,32 +1,43 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler
-from db import db
-from utils import format_char, add_inventory
+from db import db, TxAbort
+from utils import add_inventory_tx, catalog
+from cards import card_cache, send_card
+import economy
+from idempotency import dedup_callback, purchase_token, stats as dedup_stats
 import random
+import time
+from typing import Optional
+
+def _tx_purchase(conn, token: str, uid: int, cid: int, price: int) -> Optional[int]:
+    # the token row commits together with the debit, so a replayed buy is a no-op
+    cur = conn.execute("INSERT OR IGNORE INTO purchases(token, user_id, char_id, price, created_at) VALUES(?,?,?,?,?)",
+                       (token, uid, cid, price, int(time.time())))
+    if cur.rowcount == 0:
+        return None
+    bal = economy.debit_tx(conn, uid, price)
+    if bal is None:
+        raise TxAbort("no_coins")
+    add_inventory_tx(conn, uid, cid)
+    return bal
 
 async def send_store(chat_id: int, context: ContextTypes.DEFAULT_TYPE):
-    chars = await db.fetchall("SELECT * FROM characters")
-    if not chars:
+    rows, _ = await catalog.get()
+    card = card_cache.from_row(random.choice(rows)) if rows else None
+    if not card:
         await context.bot.send_message(chat_id, "⚠ Store ထဲမှာ Character မရှိသေးပါ")
         return
-    char = random.choice(chars)
     keyboard = [[
-        InlineKeyboardButton("🛒 Buy", callback_data=f"buy_{char[0]}"),
+        InlineKeyboardButton("🛒 Buy", callback_data=f"buy_{card.char.id}"),
         InlineKeyboardButton("➡ Next", callback_data="next_store")
     ]]
     markup = InlineKeyboardMarkup(keyboard)
-    caption = await format_char(char)
-    if char[6]:
-        try:
-            await context.bot.send_photo(chat_id=chat_id, photo=char[6], caption=caption, reply_markup=markup)
-            return
-        except Exception:
-            pass
-    await context.bot.send_message(chat_id=chat_id, text=caption, reply_markup=markup)
+    await send_card(context.bot, chat_id, card, reply_markup=markup)
 
 async def store_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await send_store(update.effective_chat.id, context)
 
+@dedup_callback
 async def store_btn(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
@@ -46,15 +57,21 @@ async def store_btn(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception:
             await q.answer("Invalid ID", show_alert=True)
             return
-        char = await db.fetchone("SELECT * FROM characters WHERE id=?", (cid,))
-        if not char:
+        card = await card_cache.get(cid)
+        if not card:
             await q.edit_message_text("❌ Character မတွေ့ပါ")
             return
-        row = await db.fetchone("SELECT coins FROM users WHERE id=?", (uid,))
-        coins = row[0] if row else 0
-        if coins < char[5]:
+        char = card.char
+        token = purchase_token(update)
+        try:
+            bal = await db.run_tx(_tx_purchase, token, uid, cid, char.price)
+        except TxAbort:
+            economy.record_declined()
             await q.edit_message_text("❌ Coins မလုံလောက်ပါ")
             return
-        await db.execute("UPDATE users SET coins=coins-? WHERE id=?", (char[5], uid), commit=True)
-        await add_inventory(uid, cid)
-        await q.edit_message_text(f"✅ Successfully Bought!\n\n📦 {char[1]} ({char[2]})")
+        if bal is None:
+            dedup_stats["purchase_replays"] += 1
+            return "✅ Already bought"
+        economy.record(uid, -char.price, bal, "store", token)
+        await q.edit_message_text(f"✅ Successfully Bought!\n\n📦 {char.name} ({char.rarity})")
+        return "✅ Already bought"
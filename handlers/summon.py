@@ -2,8 +2,11 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from db import db
-from utils import init_user, choose_chars, summon_animation, add_inventory, add_exp, format_char
+from utils import init_user, choose_chars, summon_animation, add_inventory, add_exp
+from cards import send_card
 from utils import RARITY_RATE
+import economy
+from summon_log import summon_log
 import asyncio
 
 SUMMON_COST = 50
@@ -12,34 +15,29 @@ TEN_SUMMON_COST = 500
 async def summon(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     await init_user(uid)
-    r = await db.fetchone("SELECT coins FROM users WHERE id=?", (uid,))
-    coins = r[0] if r else 0
-    if coins < SUMMON_COST:
+    if await economy.debit(uid, SUMMON_COST, "summon") is None:
         await update.message.reply_text("❌ Coins မလုံလောက်ပါ")
         return
-    await db.execute("UPDATE users SET coins=coins-? WHERE id=?", (SUMMON_COST, uid), commit=True)
     msg = await update.message.reply_text("🎰 Summon Initializing...")
     await summon_animation(msg)
-    chars = await choose_chars(1)
-    if not chars:
+    pulls = await choose_chars(1)
+    if not pulls:
         await msg.edit_text("⚠ No Character Found")
         return
-    ch = chars[0]
-    await add_inventory(uid, ch[0])
+    rolled, card = pulls[0]
+    summon_log.record(uid, [(rolled, card.char)], SUMMON_COST)
+    await add_inventory(uid, card.char.id)
     leveled, new_lvl = await add_exp(uid, 10)
-    caption = "🌟 SUMMON RESULT 🌟\n\n" + await format_char(ch)
-    try:
-        if ch[6]:
-            await context.bot.send_photo(chat_id=update.effective_chat.id, photo=ch[6], caption=caption)
-            try:
-                await msg.delete()
-            except Exception:
-                pass
-            if leveled:
-                await update.message.reply_text(f"🎉 Level up! အဆင့် {new_lvl} ဖြစ်လာပါသည်")
-            return
-    except Exception:
-        pass
+    header = "🌟 SUMMON RESULT 🌟\n\n"
+    caption = header + card.caption
+    if await send_card(context.bot, update.effective_chat.id, card, header, text_fallback=False):
+        try:
+            await msg.delete()
+        except Exception:
+            pass
+        if leveled:
+            await update.message.reply_text(f"🎉 Level up! အဆင့် {new_lvl} ဖြစ်လာပါသည်")
+        return
     try:
         await msg.edit_text(caption)
     except Exception:
@@ -50,24 +48,23 @@ async def summon(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def summon10(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     await init_user(uid)
-    r = await db.fetchone("SELECT coins FROM users WHERE id=?", (uid,))
-    coins = r[0] if r else 0
-    if coins < TEN_SUMMON_COST:
+    if await economy.debit(uid, TEN_SUMMON_COST, "summon10") is None:
         await update.message.reply_text("❌ Coins မလုံလောက်ပါ")
         return
-    await db.execute("UPDATE users SET coins=coins-? WHERE id=?", (TEN_SUMMON_COST, uid), commit=True)
     msg = await update.message.reply_text("🎰 10x Summon Initializing...")
     await summon_animation(msg)
-    res = await choose_chars(10)
+    pulls = [(rolled, card.char) for rolled, card in await choose_chars(10)]
+    summon_log.record(uid, pulls, TEN_SUMMON_COST)
+    res = [ch for _, ch in pulls]
     text = "🌟 10x SUMMON RESULT 🌟\n\n"
     count = {}
     leveled_any = False
     for ch in res:
-        await add_inventory(uid, ch[0])
+        await add_inventory(uid, ch.id)
         leveled, new_lvl = await add_exp(uid, 10)
         if leveled:
             leveled_any = True
-        key = f"{ch[1]} ({ch[2]})"
+        key = f"{ch.name} ({ch.rarity})"
         count[key] = count.get(key, 0) + 1
     for k, v in count.items():
         text += f"{k} x{v}\n"
@@ -0,0 +1,94 @@
+# idempotency.py — drop repeated callback taps before they reach the handlers
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+
+CALLBACK_TTL = 30
+CALLBACK_CACHE_SIZE = 10000
+_PENDING = object()
+
+stats = {
+    "callbacks": 0,
+    "duplicates": 0,
+    "inflight_duplicates": 0,
+    "purchase_replays": 0,
+}
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl` seconds after insertion."""
+
+    def __init__(self, ttl: float = CALLBACK_TTL, maxsize: int = CALLBACK_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self.data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self.data[key]
+            return default
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.data[key] = (time.monotonic() + self.ttl, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self.data.pop(key, None)
+        return default if item is None else item[1]
+
+callback_cache = TTLCache()
+
+def callback_key(update: Update) -> tuple:
+    q = update.callback_query
+    msg_id = q.message.message_id if q.message else q.inline_message_id
+    return (q.from_user.id, msg_id, q.data)
+
+def dedup_callback(handler):
+    """Run a callback handler once per (user, message, data) within CALLBACK_TTL.
+    Repeats are answered from the cache (the handler may return an answer text
+    to replay) and never reach the handler or the DB."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        key = callback_key(update)
+        stats["callbacks"] += 1
+        cached = callback_cache.get(key, None)
+        if cached is not None:
+            stats["duplicates"] += 1
+            if cached is _PENDING:
+                stats["inflight_duplicates"] += 1
+                cached = "⏳"
+            try:
+                await update.callback_query.answer(cached or None)
+            except Exception:
+                pass
+            return
+        callback_cache.set(key, _PENDING)
+        try:
+            answer: Optional[str] = await handler(update, context)
+        except Exception:
+            # let the user retry a tap that failed
+            callback_cache.pop(key)
+            raise
+        callback_cache.set(key, answer or "")
+    return wrapper
+
+def purchase_token(update: Update) -> str:
+    """Idempotency token for a store purchase: one per user per store card."""
+    q = update.callback_query
+    if q.message:
+        return f"{q.from_user.id}:{q.message.chat.id}:{q.message.message_id}"
+    # inline messages (or ones too old to be accessible) only carry their own id
+    return f"{q.from_user.id}:inline:{q.inline_message_id}"
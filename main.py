@@ -1,25 +1,65 @@
 # main.py (skeleton) — minimal startup that wires handlers
+# Kept light at import time: the cluster ingress imports it for BOT_TOKEN only, and
+# the bot modules load inside build_app() where startup times them.
 import os
 from dotenv import load_dotenv
-from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler
-from db import db
-
 load_dotenv()
+from startup import profile, warm_up
+
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 OWNER_ID = int(os.getenv("OWNER_ID", "0"))
 
-async def main():
-    await db.init()
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def shutdown(app):
+    import economy
+    import summon_log
+    # flush batched writers so nothing buffered is lost on a clean stop
+    await economy.shutdown(app)
+    await summon_log.summon_log.flush()
+
+# run_polling/run_webhook call these around polling (cluster workers drive the app
+# themselves and call warm_up/shutdown directly)
+async def post_init(app):
+    # runs before the first getUpdates, so polling waits for warm caches
+    await warm_up()
+    print(f"Startup:\n{profile.report()}", end="")
+    print("Bot started")
+
+async def post_shutdown(app):
+    from db import db
+    await shutdown(app)
+    await db.close()
+
+def build_app(token: str = None, primary: bool = True, builder=None):
+    """Application with every handler and job registered. Only the primary instance
+    runs the DB-wide background jobs; cluster workers pass primary=False."""
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, TypeHandler
+    from ratelimit import rate_limit, LoadSheddingProcessor
+    import maintenance
+    import economy
+    import summon_log
+
+    builder = builder or ApplicationBuilder()
+    app = (
+        builder.token(token or BOT_TOKEN)
+        .concurrent_updates(LoadSheddingProcessor())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # rate limiting runs before every other handler group
+    app.add_handler(TypeHandler(Update, rate_limit), group=-1)
 
     # import handlers
     from handlers.basic import start, balance, profile, tops_cmd
     from handlers.summon import summon, summon10
     from handlers.store import store_cmd, store_btn
     from handlers.inventory import inventory_cmd, inv_btn
-    from handlers.admin import addadmin_cmd, removeadmin_cmd, admins_cmd, addcoins_cmd, upload_cmd
+    from handlers.admin import addadmin_cmd, removeadmin_cmd, admins_cmd, addcoins_cmd, upload_cmd, metrics_cmd, stats_cmd, vacuum_cmd
     from handlers.battle import battle_cmd
     from handlers.quest import createquest_cmd, delquest_cmd, quest_cmd, claim_cmd
+    from handlers.market import sell_cmd, buy_cmd, orders_cmd, cancelorder_cmd
 
     # register handlers
     app.add_handler(CommandHandler("start", start))
@@ -41,6 +81,9 @@ async def main():
     app.add_handler(CommandHandler("removeadmin", removeadmin_cmd))
     app.add_handler(CommandHandler("admins", admins_cmd))
     app.add_handler(CommandHandler("addcoins", addcoins_cmd))
+    app.add_handler(CommandHandler("metrics", metrics_cmd))
+    app.add_handler(CommandHandler("stats", stats_cmd))
+    app.add_handler(CommandHandler("vacuum", vacuum_cmd))
 
     app.add_handler(CommandHandler("battle", battle_cmd))
 
@@ -49,9 +92,26 @@ async def main():
     app.add_handler(CommandHandler("quest", quest_cmd))
     app.add_handler(CommandHandler("claim", claim_cmd))
 
-    print("Bot started")
-    await app.run_polling()
+    app.add_handler(CommandHandler("sell", sell_cmd))
+    app.add_handler(CommandHandler("buy", buy_cmd))
+    app.add_handler(CommandHandler("orders", orders_cmd))
+    app.add_handler(CommandHandler("cancelorder", cancelorder_cmd))
+
+    if primary:
+        maintenance.schedule(app.job_queue)
+    economy.schedule(app.job_queue, primary)
+    summon_log.schedule(app.job_queue, primary)
+    return app
+
+def main():
+    with profile.phase("imports"):
+        app = build_app()
+    # run_polling owns the event loop; warm-up happens in post_init
+    app.run_polling()
 
 if __name__ == '__main__':
-    import asyncio
-    asyncio.run(main())
+    if int(os.getenv("WORKERS", "0")) > 0:
+        import cluster
+        cluster.run(int(os.getenv("WORKERS")))
+    else:
+        main()
@@ -0,0 +1,160 @@
+# maintenance.py — background DB upkeep on PTB's JobQueue
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Dict
+from telegram.ext import ContextTypes, JobQueue
+from db import db, BACKUP_DIR
+
+CHECKPOINT_INTERVAL = int(os.getenv("CHECKPOINT_INTERVAL", "60"))
+OPTIMIZE_INTERVAL = int(os.getenv("OPTIMIZE_INTERVAL", "3600"))
+VACUUM_INTERVAL = int(os.getenv("VACUUM_INTERVAL", "21600"))
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "86400"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+WAL_TRUNCATE_BYTES = 64 * 1024 * 1024
+VACUUM_PAGES = 2000
+ANALYSIS_LIMIT = 1000
+FULL_VACUUM_FREE_RATIO = 0.25
+PURCHASE_TOKEN_TTL = 86400
+PROBE_INTERVAL = 0.05
+
+# per job: runs, last/max duration, and DB round-trip latency seen by requests meanwhile
+stats: Dict[str, dict] = {}
+
+async def _probe(samples: list):
+    # a SELECT 1 queued on the shared connection waits exactly as long as a request would
+    while True:
+        t0 = time.perf_counter()
+        await db.fetchone("SELECT 1")
+        samples.append(time.perf_counter() - t0)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+async def _run(name: str, fn):
+    samples: list = []
+    probe = asyncio.create_task(_probe(samples))
+    t0 = time.perf_counter()
+    try:
+        detail = await fn()
+    finally:
+        dt = time.perf_counter() - t0
+        probe.cancel()
+    st = stats.setdefault(name, {"runs": 0, "last_ms": 0.0, "max_ms": 0.0, "probe_max_ms": 0.0, "detail": ""})
+    st["runs"] += 1
+    st["last_ms"] = dt * 1000
+    st["max_ms"] = max(st["max_ms"], dt * 1000)
+    st["probe_max_ms"] = max(samples, default=0) * 1000
+    st["detail"] = detail or ""
+
+def _wal_size() -> int:
+    try:
+        return os.path.getsize(db.path + "-wal")
+    except OSError:
+        return 0
+
+def _with_conn(path: str, timeout: float, fn, *args):
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    try:
+        return fn(conn, *args)
+    finally:
+        conn.close()
+
+async def _off_path(fn, *args, timeout: float = 5.0):
+    """Run fn(conn, *args) on a connection of its own in a thread: lock waits and
+    scans never queue behind (or in front of) the bot's requests."""
+    return await asyncio.to_thread(_with_conn, db.path, timeout, fn, *args)
+
+def _wal_checkpoint(conn, mode: str):
+    return conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+async def _checkpoint():
+    size = _wal_size()
+    mode = "TRUNCATE" if size >= WAL_TRUNCATE_BYTES else "PASSIVE"
+    row = await _off_path(_wal_checkpoint, mode)
+    return f"{mode} wal={size // 1024}KB busy={row[0]} frames={row[1]}/{row[2]}"
+
+def _analyze(conn):
+    # PRAGMA optimize only looks at tables this connection has queried, which for
+    # a fresh one is none; a sampled ANALYZE gives the planner the same statistics
+    conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+
+async def _optimize():
+    await _off_path(_analyze, timeout=30.0)
+    return f"analyze limit={ANALYSIS_LIMIT}"
+
+def _incremental_vacuum(conn, pages: int) -> int:
+    # the pragma frees one page per step and execute() steps a row-less statement
+    # only once; executescript steps it to completion
+    conn.executescript(f"PRAGMA incremental_vacuum({pages});")
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+async def _vacuum():
+    cutoff = int(time.time()) - PURCHASE_TOKEN_TTL
+    await db.execute("DELETE FROM purchases WHERE created_at < ?", (cutoff,), commit=True)
+    free = (await db.fetchone("PRAGMA freelist_count"))[0]
+    pages = (await db.fetchone("PRAGMA page_count"))[0]
+    mode = (await db.fetchone("PRAGMA auto_vacuum"))[0]
+    if mode == 2:
+        left = await _off_path(_incremental_vacuum, VACUUM_PAGES)
+        return f"incremental free={free}->{left}/{pages}"
+    if pages and free / pages >= FULL_VACUUM_FREE_RATIO:
+        # a full rebuild holds the write lock throughout; leave it to an admin (/vacuum)
+        return f"full VACUUM advised free={free}/{pages}"
+    return f"skipped free={free}/{pages}"
+
+def _full_vacuum(conn):
+    # readers keep going under WAL, writers wait for the lock;
+    # also switches files created before auto_vacuum to incremental mode
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+async def _vacuum_full():
+    free = (await db.fetchone("PRAGMA freelist_count"))[0]
+    pages = (await db.fetchone("PRAGMA page_count"))[0]
+    await _off_path(_full_vacuum, timeout=60.0)
+    after = (await db.fetchone("PRAGMA page_count"))[0]
+    return f"full pages={pages}->{after} (free was {free})"
+
+async def full_vacuum() -> str:
+    """One-off rebuild, run on demand only: writes stall until it finishes."""
+    await _run("vacuum_full", _vacuum_full)
+    return stats["vacuum_full"]["detail"]
+
+async def _backup():
+    path = await db.backup()
+    files = await db.list_backups()
+    for f in files[:-BACKUP_KEEP]:
+        try:
+            os.remove(os.path.join(BACKUP_DIR, f))
+        except OSError:
+            pass
+    return path or "failed"
+
+async def checkpoint_job(context: ContextTypes.DEFAULT_TYPE):
+    await _run("checkpoint", _checkpoint)
+
+async def optimize_job(context: ContextTypes.DEFAULT_TYPE):
+    await _run("optimize", _optimize)
+
+async def vacuum_job(context: ContextTypes.DEFAULT_TYPE):
+    await _run("vacuum", _vacuum)
+
+async def backup_job(context: ContextTypes.DEFAULT_TYPE):
+    await _run("backup", _backup)
+
+def schedule(job_queue: JobQueue):
+    """Register all maintenance jobs; first runs are staggered away from startup."""
+    job_queue.run_repeating(checkpoint_job, CHECKPOINT_INTERVAL, first=CHECKPOINT_INTERVAL, name="db_checkpoint")
+    job_queue.run_repeating(optimize_job, OPTIMIZE_INTERVAL, first=300, name="db_optimize")
+    job_queue.run_repeating(vacuum_job, VACUUM_INTERVAL, first=900, name="db_vacuum")
+    job_queue.run_repeating(backup_job, BACKUP_INTERVAL, first=1800, name="db_backup")
+
+def report() -> str:
+    text = ""
+    for name, st in stats.items():
+        text += (
+            f"   {name}: x{st['runs']} last {st['last_ms']:.1f}ms max {st['max_ms']:.1f}ms"
+            f" | req latency max {st['probe_max_ms']:.1f}ms {st['detail']}\n"
+        )
+    return text or "   (no runs yet)\n"
@@ -0,0 +1,170 @@
+# market.py — player-to-player market
+# Open sell orders live in an in-memory order book (one price heap per character)
+# and are mirrored to the market_orders table. Every match settles in one transaction.
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+from db import db, TxAbort
+from utils import add_inventory_tx
+import economy
+
+MAX_PRICE = 10_000_000
+BOOK_DEPTH = 10
+
+class Order:
+    __slots__ = ("id", "seller_id", "char_id", "price", "created_at")
+
+    def __init__(self, id: int, seller_id: int, char_id: int, price: int, created_at: int):
+        self.id = id
+        self.seller_id = seller_id
+        self.char_id = char_id
+        self.price = price
+        self.created_at = created_at
+
+class OrderBook:
+    """Per-character min-heaps of (price, order_id): cheapest first, oldest first on ties.
+    Filled/cancelled orders are only dropped from `orders`; their heap entries are
+    skipped lazily and the heap is rebuilt once they make up half of it."""
+
+    def __init__(self):
+        self.heaps: Dict[int, List[Tuple[int, int]]] = {}
+        self.stale: Dict[int, int] = {}
+        self.orders: Dict[int, Order] = {}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order: Order):
+        self.orders[order.id] = order
+        heapq.heappush(self.heaps.setdefault(order.char_id, []), (order.price, order.id))
+
+    def remove(self, order_id: int) -> Optional[Order]:
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        cid = order.char_id
+        self.stale[cid] = self.stale.get(cid, 0) + 1
+        heap = self.heaps[cid]
+        if self.stale[cid] * 2 >= len(heap):
+            heap = list({e[1]: e for e in heap if e[1] in self.orders}.values())
+            heapq.heapify(heap)
+            self.stale[cid] = 0
+            if heap:
+                self.heaps[cid] = heap
+            else:
+                del self.heaps[cid]
+        return order
+
+    def cheapest(self, char_id: int, n: int = BOOK_DEPTH, exclude_seller: Optional[int] = None) -> List[Order]:
+        """Return up to n live orders in price order without popping the heap:
+        walks the heap as a tree from the root, O(n log n) regardless of book size."""
+        heap = self.heaps.get(char_id)
+        if not heap:
+            return []
+        res = []
+        seen = set()
+        frontier = [(heap[0], 0)]
+        while frontier and len(res) < n:
+            (price, oid), i = heapq.heappop(frontier)
+            order = self.orders.get(oid)
+            # an order put back after a failed match can have a second, stale entry
+            if order is not None and oid not in seen and order.seller_id != exclude_seller:
+                seen.add(oid)
+                res.append(order)
+            for c in (2 * i + 1, 2 * i + 2):
+                if c < len(heap):
+                    heapq.heappush(frontier, (heap[c], c))
+        return res
+
+    def best(self, char_id: int, exclude_seller: Optional[int] = None) -> Optional[Order]:
+        res = self.cheapest(char_id, 1, exclude_seller)
+        return res[0] if res else None
+
+def _tx_list(conn, seller_id: int, char_id: int, price: int, now: int) -> int:
+    # escrow one copy out of the seller's inventory
+    cur = conn.execute("UPDATE inventory SET count = count - 1 WHERE user_id=? AND char_id=? AND count > 0", (seller_id, char_id))
+    if cur.rowcount != 1:
+        raise TxAbort("no_item")
+    conn.execute("DELETE FROM inventory WHERE user_id=? AND char_id=? AND count <= 0", (seller_id, char_id))
+    cur = conn.execute("INSERT INTO market_orders(seller_id, char_id, price, created_at) VALUES(?,?,?,?)", (seller_id, char_id, price, now))
+    return cur.lastrowid
+
+def _tx_settle(conn, order_id: int, buyer_id: int, seller_id: int, char_id: int, price: int) -> Tuple[int, int]:
+    cur = conn.execute("DELETE FROM market_orders WHERE id=?", (order_id,))
+    if cur.rowcount != 1:
+        raise TxAbort("gone")
+    balances = economy.transfer_tx(conn, buyer_id, seller_id, price)
+    add_inventory_tx(conn, buyer_id, char_id)
+    return balances
+
+def _tx_cancel(conn, order_id: int, seller_id: int, char_id: int):
+    cur = conn.execute("DELETE FROM market_orders WHERE id=?", (order_id,))
+    if cur.rowcount != 1:
+        raise TxAbort("gone")
+    add_inventory_tx(conn, seller_id, char_id)
+
+class Market:
+    def __init__(self):
+        self.book = OrderBook()
+
+    async def load(self):
+        """Rebuild the in-memory book from market_orders (call once after db.init)."""
+        self.book = OrderBook()
+        rows = await db.fetchall("SELECT id, seller_id, char_id, price, created_at FROM market_orders") or []
+        for r in rows:
+            self.book.add(Order(*r))
+
+    def listing(self, char_id: int, n: int = BOOK_DEPTH) -> List[Order]:
+        return self.book.cheapest(char_id, n)
+
+    async def sell(self, seller_id: int, char_id: int, price: int) -> Tuple[str, Optional[Order]]:
+        now = int(time.time())
+        try:
+            oid = await db.run_tx(_tx_list, seller_id, char_id, price, now)
+        except TxAbort as e:
+            return e.status, None
+        order = Order(oid, seller_id, char_id, price, now)
+        self.book.add(order)
+        return "ok", order
+
+    async def buy(self, buyer_id: int, char_id: int, max_price: Optional[int] = None) -> Tuple[str, Optional[Order], int]:
+        """Fill the cheapest order not owned by the buyer. Returns (status, order, buyer_coins)."""
+        order = self.book.best(char_id, exclude_seller=buyer_id)
+        if order is None:
+            return "no_orders", None, 0
+        if max_price is not None and order.price > max_price:
+            return "too_expensive", order, 0
+        # take it off the book before awaiting so a concurrent buyer can't match it too
+        self.book.remove(order.id)
+        try:
+            balances = await db.run_tx(_tx_settle, order.id, buyer_id, order.seller_id, char_id, order.price)
+        except TxAbort as e:
+            if e.status != "gone":
+                self.book.add(order)
+            if e.status == "no_coins":
+                economy.record_declined()
+            return e.status, order, 0
+        except Exception:
+            self.book.add(order)
+            raise
+        economy.record_transfer(buyer_id, order.seller_id, order.price, balances, "market", str(order.id))
+        return "ok", order, balances[0]
+
+    async def cancel(self, seller_id: int, order_id: int) -> Tuple[str, Optional[Order]]:
+        order = self.book.orders.get(order_id)
+        if order is None:
+            return "gone", None
+        if order.seller_id != seller_id:
+            return "not_owner", order
+        self.book.remove(order_id)
+        try:
+            await db.run_tx(_tx_cancel, order_id, seller_id, order.char_id)
+        except TxAbort as e:
+            return e.status, order
+        except Exception:
+            self.book.add(order)
+            raise
+        return "ok", order
+
+# single global market instance (await market.load() after db.init())
+market = Market()
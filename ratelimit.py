@@ -0,0 +1,163 @@
+# ratelimit.py — per-user token buckets in front of the handlers + load shedding
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, BaseUpdateProcessor, ContextTypes
+
+# (refill per second, burst) — every command also draws from the user's global bucket
+USER_LIMIT = (float(os.getenv("RL_USER_RATE", "1")), int(os.getenv("RL_USER_BURST", "6")))
+COMMAND_LIMITS = {
+    "summon": (1 / 5, 1),
+    "summon10": (1 / 10, 1),
+    "battle": (1 / 5, 1),
+    "store": (1 / 2, 3),
+    "inventory": (1 / 2, 3),
+    "tops": (1 / 10, 1),
+    "cb": (2, 5),
+}
+DEFAULT_COMMAND_LIMIT = (1 / 2, 3)
+IDLE_TTL = 600
+SWEEP_INTERVAL = 60
+WARN_INTERVAL = 10
+
+# global concurrency budget: low-priority work (leaderboard, animations) gets a slice
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "64"))
+LOW_PRIO_CONCURRENCY = int(os.getenv("LOW_PRIO_CONCURRENCY", "16"))
+LOW_PRIO_QUEUE = int(os.getenv("LOW_PRIO_QUEUE", "32"))
+LOW_PRIORITY = {"tops", "summon", "summon10", "battle"}
+
+stats = {
+    "allowed": 0,
+    "limited": 0,
+    "shed": 0,
+    "queued": 0,
+    "buckets": 0,
+    "evicted": 0,
+    "peak_active": 0,
+}
+
+class Bucket:
+    __slots__ = ("tokens", "ts")
+
+    def __init__(self, tokens: float, ts: float):
+        self.tokens = tokens
+        self.ts = ts
+
+    def peek(self, rate: float, burst: int, now: float) -> float:
+        self.tokens = min(burst, self.tokens + (now - self.ts) * rate)
+        self.ts = now
+        return self.tokens
+
+buckets: Dict[Tuple[int, str], Bucket] = {}
+_warned: Dict[int, float] = {}
+_last_sweep = 0.0
+
+def command_of(update: object) -> Optional[str]:
+    """Command name for a /command message, "cb" for callback queries, else None."""
+    if not isinstance(update, Update):
+        return None
+    if update.callback_query:
+        return "cb"
+    msg = update.message
+    if msg and msg.text and msg.text.startswith("/"):
+        return msg.text.split()[0][1:].split("@")[0].lower()
+    return None
+
+def _bucket(uid: int, name: str, burst: int, now: float) -> Bucket:
+    b = buckets.get((uid, name))
+    if b is None:
+        b = buckets[(uid, name)] = Bucket(burst, now)
+    return b
+
+def _sweep(now: float):
+    # an idle bucket has refilled to burst, dropping it loses nothing
+    global _last_sweep
+    _last_sweep = now
+    idle = [k for k, b in buckets.items() if now - b.ts > IDLE_TTL]
+    for k in idle:
+        del buckets[k]
+    for uid in [u for u, t in _warned.items() if now - t > IDLE_TTL]:
+        del _warned[uid]
+    stats["evicted"] += len(idle)
+
+def allow(uid: int, cmd: str, now: Optional[float] = None) -> bool:
+    """Take one token from both the user's and the (user, command) bucket, or neither."""
+    now = time.monotonic() if now is None else now
+    if now - _last_sweep > SWEEP_INTERVAL:
+        _sweep(now)
+    rate, burst = COMMAND_LIMITS.get(cmd, DEFAULT_COMMAND_LIMIT)
+    ub = _bucket(uid, "", USER_LIMIT[1], now)
+    cb = _bucket(uid, cmd, burst, now)
+    stats["buckets"] = len(buckets)
+    if ub.peek(*USER_LIMIT, now) < 1 or cb.peek(rate, burst, now) < 1:
+        return False
+    ub.tokens -= 1
+    cb.tokens -= 1
+    return True
+
+async def rate_limit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """TypeHandler callback registered in group -1, ahead of every command handler."""
+    cmd = command_of(update)
+    if cmd is None or not update.effective_user:
+        return
+    uid = update.effective_user.id
+    if allow(uid, cmd):
+        stats["allowed"] += 1
+        return
+    stats["limited"] += 1
+    now = time.monotonic()
+    try:
+        if update.callback_query:
+            await update.callback_query.answer("⏳ Slow down")
+        elif now - _warned.get(uid, 0) > WARN_INTERVAL:
+            _warned[uid] = now
+            await update.message.reply_text("⏳ ခဏစောင့်ပြီးမှ ပြန်ကြိုးစားပါ")
+    except Exception:
+        pass
+    raise ApplicationHandlerStop
+
+class LoadSheddingProcessor(BaseUpdateProcessor):
+    """Concurrent update processor that caps low-priority commands at
+    LOW_PRIO_CONCURRENCY, queues up to LOW_PRIO_QUEUE more and sheds the rest,
+    so /tops and animations can't take every slot under overload."""
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENCY):
+        super().__init__(max_concurrent_updates)
+        self.low = asyncio.Semaphore(LOW_PRIO_CONCURRENCY)
+        self.low_active = 0
+        self.low_waiting = 0
+
+    async def do_process_update(self, update, coroutine):
+        stats["peak_active"] = max(stats["peak_active"], self.current_concurrent_updates)
+        if command_of(update) not in LOW_PRIORITY:
+            await coroutine
+            return
+        if self.low_active >= LOW_PRIO_CONCURRENCY:
+            if self.low_waiting >= LOW_PRIO_QUEUE:
+                stats["shed"] += 1
+                coroutine.close()
+                try:
+                    await update.message.reply_text("⚠ Bot is busy, try again soon")
+                except Exception:
+                    pass
+                return
+            stats["queued"] += 1
+        self.low_waiting += 1
+        try:
+            await self.low.acquire()
+        finally:
+            self.low_waiting -= 1
+        self.low_active += 1
+        try:
+            await coroutine
+        finally:
+            self.low_active -= 1
+            self.low.release()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
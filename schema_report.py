@@ -0,0 +1,128 @@
+# schema_report.py — migration dry run + EXPLAIN QUERY PLAN for every query in the bot
+# usage: python schema_report.py [db_path]
+# Works on a temporary copy: pending migrations are listed, applied to the copy only,
+# and every query found in the bot's modules must be answered through an index.
+# Exit 1 otherwise.
+import ast
+import glob
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from typing import List, Tuple
+from db import DB_FILE, MIGRATIONS, _apply_migration
+
+# every SQL literal in the bot's modules is checked, so the report can't drift from
+# the code; db.py (one-off migration backfills) and the bench scripts are left out
+SQL_RE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s")
+SKIP_FILES = {"db.py", "schema_report.py"}
+
+class _SqlFinder(ast.NodeVisitor):
+    def __init__(self, module: str):
+        self.module = module
+        self.stack: List[str] = []
+        self.found: List[Tuple[str, str]] = []
+        self.dynamic: List[str] = []
+
+    def _where(self) -> str:
+        return ".".join([self.module] + self.stack)
+
+    def _visit_scope(self, node):
+        self.stack.append(node.name)
+        self.generic_visit(node)
+        self.stack.pop()
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_scope
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, str) and SQL_RE.match(node.value):
+            self.found.append((self._where(), " ".join(node.value.split())))
+
+    def visit_JoinedStr(self, node):
+        head = node.values[0] if node.values else None
+        if isinstance(head, ast.Constant) and isinstance(head.value, str) and SQL_RE.match(head.value):
+            self.dynamic.append(self._where())
+        self.generic_visit(node)
+
+def collect_queries(root: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """(where, sql) for every SQL string literal, plus the places that build SQL with f-strings."""
+    queries, dynamic, seen = [], [], set()
+    files = sorted(glob.glob(os.path.join(root, "*.py")) + glob.glob(os.path.join(root, "handlers", "*.py")))
+    for path in files:
+        rel = os.path.relpath(path, root)
+        if rel in SKIP_FILES or os.path.basename(rel).startswith("bench_"):
+            continue
+        finder = _SqlFinder(rel[:-3].replace(os.sep, "."))
+        with open(path, encoding="utf-8") as f:
+            finder.visit(ast.parse(f.read(), rel))
+        for item in finder.found:
+            if item not in seen:
+                seen.add(item)
+                queries.append(item)
+        dynamic += finder.dynamic
+    return queries, dynamic
+
+# full reads of small catalog tables (or startup loads) — scanning is the point
+FULL_SCAN_OK = {
+    "SELECT id, name, rarity, faction, power, price, file_id FROM characters",
+    "SELECT id FROM users LIMIT ?",
+    "SELECT id, name, reward_coins, reward_exp, description FROM quests",
+    "SELECT user_id FROM admins",
+    "SELECT id, seller_id, char_id, price, created_at FROM market_orders",
+    "SELECT rarity, pulls FROM summon_totals",
+}
+
+def plan_ok(details) -> bool:
+    for d in details:
+        if d.startswith("SCAN") and "INDEX" not in d and d != "SCAN CONSTANT ROW":
+            return False
+        if "TEMP B-TREE" in d:
+            return False
+    return True
+
+def main(path: str) -> int:
+    tmp = os.path.join(tempfile.mkdtemp(), "report.db")
+    dst = sqlite3.connect(tmp)
+    if os.path.exists(path):
+        src = sqlite3.connect(path)
+        src.backup(dst)
+        src.close()
+    current = dst.execute("PRAGMA user_version").fetchone()[0]
+    pending = [(v, step) for v, step in MIGRATIONS if v > current]
+    print(f"DB: {path}  user_version={current}")
+    print(f"Pending migrations: {[v for v, _ in pending] or 'none'}")
+    for v, step in pending:
+        _apply_migration(dst, v, step)
+    print(f"(applied to temporary copy -> user_version={dst.execute('PRAGMA user_version').fetchone()[0]})\n")
+
+    queries, dynamic = collect_queries(os.path.dirname(os.path.abspath(__file__)))
+    failed = 0
+    for where, sql in queries:
+        params = (0,) * sql.count("?")
+        try:
+            details = [r[3] for r in dst.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        except sqlite3.Error as e:
+            details = [f"error: {e}"]
+            failed += 1
+            print(f"[FAIL] {where}: {sql}")
+            print(f"        {details[0]}")
+            continue
+        if sql in FULL_SCAN_OK:
+            status = "SCAN-OK"
+        elif plan_ok(details):
+            status = "OK"
+        else:
+            status = "FAIL"
+            failed += 1
+        print(f"[{status}] {where}: {sql}")
+        for d in details:
+            print(f"        {d}")
+    dst.close()
+    for where in dynamic:
+        print(f"[SKIP] {where}: SQL built with an f-string, not checked")
+    print(f"\n{len(queries) - failed}/{len(queries)} queries use an index or an allowed scan")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else DB_FILE))
@@ -0,0 +1,103 @@
+# startup.py — ordered startup with a timed cache warm-up
+# The bot only starts taking updates (polling, or routing in cluster mode) after
+# warm_up() returns, so the first requests after a restart hit warm caches.
+import asyncio
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+from db import db
+
+KNOWN_USERS_PRELOAD = int(os.getenv("KNOWN_USERS_PRELOAD", "200000"))
+
+class StartupProfile:
+    """Wall time per startup phase, in the order they ran."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float, str]] = []
+        self.ready_after: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        # the body may set info["note"] to annotate the report line
+        info = {"note": ""}
+        t0 = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.phases.append((name, time.perf_counter() - t0, info["note"]))
+
+    def add(self, name: str, seconds: float, note: str = ""):
+        self.phases.append((name, seconds, note))
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+
+    def report(self) -> str:
+        lines = [f"   {name:<18} {dt * 1000:8.1f} ms  {note}".rstrip() for name, dt, note in self.phases]
+        if self.ready_after is not None:
+            lines.append(f"   {'ready after':<18} {self.ready_after * 1000:8.1f} ms")
+        return "\n".join(lines) + "\n"
+
+profile = StartupProfile()
+
+def _read(path: str, fn: Callable, *args):
+    # own read-only connection per loader, so the loads really run side by side
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return fn(conn, *args), time.perf_counter() - t0
+    finally:
+        conn.close()
+
+def _hot_first(rows, by_rarity) -> list:
+    # a card's odds are its rarity's rate split over that rarity's pool
+    from utils import RARITY_RATE
+    odds = {r: RARITY_RATE.get(r, 0) / len(pool) for r, pool in by_rarity.items()}
+    return sorted(rows, key=lambda row: odds.get(row[2], 0), reverse=True)
+
+async def warm_up(primary: bool = True, shard: Optional[Tuple[int, int]] = None):
+    """Open the DB, size its caches and preload everything the hot paths read.
+    shard=(index, count) keeps only this cluster worker's users."""
+    import utils
+    from cards import card_cache
+    from handlers.quest import load_quests, quest_catalog
+
+    with profile.phase("db.init"):
+        await db.init()
+
+    with profile.phase("db.tune") as p:
+        size, mmap, cache_kb = await db.tune()
+        p["note"] = f"db {size / 1e6:.1f}MB, mmap {mmap >> 20}MB, cache {cache_kb >> 10}MB"
+
+    with profile.phase("preload") as p:
+        (cat, t_cat), (quests, t_q), (uids, t_u) = await asyncio.gather(
+            asyncio.to_thread(_read, db.path, utils.load_catalog),
+            asyncio.to_thread(_read, db.path, load_quests),
+            asyncio.to_thread(_read, db.path, utils.load_user_ids, KNOWN_USERS_PRELOAD),
+        )
+        utils.catalog.set(cat)
+        quest_catalog.set(quests)
+        if shard is not None:
+            from cluster import shard_of_user
+            idx, n = shard
+            uids = [u for u in uids if shard_of_user(u, n) == idx]
+        utils.known_users.update(uids)
+        p["note"] = "3 loads in parallel"
+    profile.add("  catalog", t_cat, f"{len(cat[0])} characters")
+    profile.add("  quests", t_q, f"{len(quests)} quests")
+    profile.add("  known users", t_u, f"{len(utils.known_users)} users")
+
+    with profile.phase("cards") as p:
+        n = card_cache.preload(_hot_first(*cat))
+        p["note"] = f"{n} rendered, {card_cache.bytes // 1024}KB"
+
+    if primary:
+        from market import market
+        with profile.phase("market") as p:
+            await market.load()
+            p["note"] = f"{len(market.book)} open orders"
+
+    profile.mark_ready()
@@ -0,0 +1,133 @@
+# summon_log.py — append-only log of every pull + incremental hourly rollups
+# Log rows are all small integers (rarity as its index in ALLOWED_RARITY). `rarity` is
+# the rolled one, so /stats compares real drop rates with RARITY_RATE even when an
+# empty pool made choose_chars fall back to another character. Each batch
+# is written together with its rollup deltas in one transaction, so /stats only ever
+# reads a handful of rollup rows no matter how long the log gets.
+import asyncio
+import time
+from collections import Counter
+from typing import List, Tuple
+from telegram.ext import ContextTypes, JobQueue
+from db import db
+from utils import ALLOWED_RARITY, RARITY_RATE
+from cards import Character
+
+FLUSH_BATCH = 500
+FLUSH_INTERVAL = 2
+HOUR_USERS_KEEP = 48
+RARITY_CODE = {r: i for i, r in enumerate(ALLOWED_RARITY)}
+
+def _tx_flush(conn, rows: List[Tuple[int, int, int, int, int]]):
+    conn.executemany("INSERT INTO summon_log(ts, user_id, char_id, rarity, cost) VALUES(?,?,?,?,?)", rows)
+    pulls = Counter((ts // 3600, rarity) for ts, _, _, rarity, _ in rows)
+    conn.executemany(
+        "INSERT INTO summon_hourly(hour, rarity, pulls) VALUES(?,?,?) "
+        "ON CONFLICT(hour, rarity) DO UPDATE SET pulls = pulls + excluded.pulls",
+        [(h, r, n) for (h, r), n in pulls.items()]
+    )
+    conn.executemany(
+        "INSERT INTO summon_totals(rarity, pulls) VALUES(?,?) "
+        "ON CONFLICT(rarity) DO UPDATE SET pulls = pulls + excluded.pulls",
+        list(Counter(r for _, _, _, r, _ in rows).items())
+    )
+    hour_pulls = Counter(ts // 3600 for ts, _, _, _, _ in rows)
+    spent: Counter = Counter()
+    new_users: Counter = Counter()
+    for hour, uid in {(ts // 3600, uid) for ts, uid, _, _, _ in rows}:
+        if conn.execute("INSERT OR IGNORE INTO summon_hour_users(hour, user_id) VALUES(?,?)", (hour, uid)).rowcount:
+            new_users[hour] += 1
+    for ts, _, _, _, cost in rows:
+        spent[ts // 3600] += cost
+    conn.executemany(
+        "INSERT INTO summon_hourly_econ(hour, pulls, coins_spent, unique_users) VALUES(?,?,?,?) "
+        "ON CONFLICT(hour) DO UPDATE SET pulls = pulls + excluded.pulls, "
+        "coins_spent = coins_spent + excluded.coins_spent, unique_users = unique_users + excluded.unique_users",
+        [(h, n, spent[h], new_users[h]) for h, n in hour_pulls.items()]
+    )
+
+class SummonLog:
+    def __init__(self):
+        self.buf: List[Tuple[int, int, int, int, int]] = []
+        self.lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.buf)
+
+    def record(self, user_id: int, pulls: List[Tuple[str, Character]], cost: int):
+        """Queue one log row per (rolled rarity, character) pull; `cost` is split evenly across the pulls."""
+        if not pulls:
+            return
+        now = int(time.time())
+        each = cost // len(pulls)
+        for rolled, ch in pulls:
+            self.buf.append((now, user_id, ch.id, RARITY_CODE.get(rolled, 0), each))
+        if len(self.buf) >= FLUSH_BATCH and not self.lock.locked():
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        async with self.lock:
+            if not self.buf:
+                return
+            rows, self.buf = self.buf, []
+            try:
+                await db.run_tx(_tx_flush, rows)
+            except Exception:
+                self.buf = rows + self.buf
+                raise
+
+    async def prune_hour_users(self):
+        # only the current hour needs the per-user set for unique counting
+        cutoff = int(time.time()) // 3600 - HOUR_USERS_KEEP
+        await db.execute("DELETE FROM summon_hour_users WHERE hour < ?", (cutoff,), commit=True)
+
+    async def stats(self) -> dict:
+        """Today's (UTC) and all-time figures, read from the rollups only."""
+        await self.flush()
+        hour = int(time.time()) // 3600
+        day_start = hour - hour % 24
+        today = dict.fromkeys(ALLOWED_RARITY, 0)
+        for r, n in await db.fetchall("SELECT rarity, pulls FROM summon_hourly WHERE hour >= ?", (day_start,)) or []:
+            today[ALLOWED_RARITY[r]] += n
+        econ = await db.fetchone(
+            "SELECT COALESCE(SUM(coins_spent), 0), COALESCE(MAX(unique_users), 0) FROM summon_hourly_econ WHERE hour >= ?",
+            (day_start,))
+        cur = await db.fetchone("SELECT unique_users FROM summon_hourly_econ WHERE hour=?", (hour,))
+        total = dict.fromkeys(ALLOWED_RARITY, 0)
+        for r, n in await db.fetchall("SELECT rarity, pulls FROM summon_totals") or []:
+            total[ALLOWED_RARITY[r]] = n
+        return {
+            "today": today,
+            "coins_today": econ[0],
+            "peak_unique_hour": econ[1],
+            "unique_this_hour": cur[0] if cur else 0,
+            "total": total,
+        }
+
+summon_log = SummonLog()
+
+def format_stats(st: dict) -> str:
+    all_pulls = sum(st["total"].values()) or 1
+    text = "📊 Summon Stats (UTC today)\n\n"
+    for r in ALLOWED_RARITY:
+        text += f"⭐ {r}: {st['today'][r]}\n"
+    text += (
+        f"\n💰 Coins spent today: {st['coins_today']}\n"
+        f"👥 Unique summoners this hour: {st['unique_this_hour']} (peak hour today: {st['peak_unique_hour']})\n"
+        f"\n📈 All-time observed vs expected rate\n"
+    )
+    for r in ALLOWED_RARITY:
+        n = st["total"][r]
+        text += f"{r}: {n} ({n * 100 / all_pulls:.2f}% / {RARITY_RATE[r]}%)\n"
+    return text
+
+async def flush_job(context: ContextTypes.DEFAULT_TYPE):
+    await summon_log.flush()
+
+async def prune_job(context: ContextTypes.DEFAULT_TYPE):
+    await summon_log.prune_hour_users()
+
+def schedule(job_queue: JobQueue, primary: bool = True):
+    job_queue.run_repeating(flush_job, FLUSH_INTERVAL, first=FLUSH_INTERVAL, name="summon_log_flush")
+    if primary:
+        job_queue.run_repeating(prune_job, 3600, first=3600, name="summon_log_prune")
@@ -1,10 +1,13 @@
 # utils.py
+import os
 import random
 import asyncio
-from typing import Tuple, Any, List
+from typing import Tuple, Any, List, Dict
 from telegram import Message
 from telegram.ext import ContextTypes
-from db import db
+from db import db, Snapshot
+import economy
+from cards import Card, Character, card_cache, render_caption
 
 RARITY_RATE = {
     "Common": 50,
@@ -15,18 +18,46 @@ RARITY_RATE = {
 }
 ALLOWED_RARITY = list(RARITY_RATE.keys())
 
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", "60"))
+
+def load_catalog(conn) -> Tuple[List[Tuple], Dict[str, List[Tuple]]]:
+    rows = conn.execute("SELECT id, name, rarity, faction, power, price, file_id FROM characters").fetchall()
+    by_rarity: Dict[str, List[Tuple]] = {}
+    for r in rows:
+        by_rarity.setdefault(r[2], []).append(r)
+    return rows, by_rarity
+
+def load_user_ids(conn, limit: int) -> List[int]:
+    return [r[0] for r in conn.execute("SELECT id FROM users LIMIT ?", (limit,))]
+
+# (rows, rows by rarity) of every character; preloaded by startup.warm_up
+catalog = Snapshot(load_catalog, CATALOG_TTL)
+
 async def is_admin(user_id: int) -> bool:
     if user_id is None:
         return False
+    # always the table: a revoke must apply in every worker process at once
     row = await db.fetchone("SELECT 1 FROM admins WHERE user_id=?", (user_id,))
     return bool(row)
 
 async def is_owner(user_id: int, owner_id: int) -> bool:
     return user_id == owner_id
 
+# users this process has already inserted/seen (startup preloads existing ones); users are never deleted
+known_users = set()
+
 async def init_user(user_id: int, start_coins:int = 200):
-    await db.execute("INSERT OR IGNORE INTO users(id, coins, level, exp, last_daily, last_battle) VALUES(?,?,?,?,?,?)",
-                     (user_id, start_coins, 1, 0, 0, 0), commit=True)
+    if user_id in known_users:
+        return
+    # read first: existing users then never take the write lock
+    if await db.fetchone("SELECT 1 FROM users WHERE id=?", (user_id,)):
+        known_users.add(user_id)
+        return
+    cur = await db.execute("INSERT OR IGNORE INTO users(id, coins, level, exp, last_daily, last_battle) VALUES(?,?,?,?,?,?)",
+                           (user_id, start_coins, 1, 0, 0, 0), commit=True)
+    if cur.rowcount == 1 and start_coins:
+        economy.record(user_id, start_coins, start_coins, "start")
+    known_users.add(user_id)
 
 def roll_rarity() -> str:
     r = random.randint(1, 100)
@@ -38,14 +69,19 @@ def roll_rarity() -> str:
     return "Common"
 
 async def add_inventory(user_id: int, char_id: int, amt: int = 1):
-    row = await db.fetchone("SELECT count FROM inventory WHERE user_id=? AND char_id=?", (user_id, char_id))
-    if row:
-        await db.execute("UPDATE inventory SET count = count + ? WHERE user_id=? AND char_id=?", (amt, user_id, char_id), commit=True)
-    else:
-        await db.execute("INSERT INTO inventory(user_id, char_id, count) VALUES(?,?,?)", (user_id, char_id, amt), commit=True)
+    await db.run_tx(add_inventory_tx, user_id, char_id, amt)
 
-async def add_exp(user_id: int, amt: int = 0):
-    row = await db.fetchone("SELECT level,exp FROM users WHERE id=?", (user_id,))
+def add_inventory_tx(conn, user_id: int, char_id: int, amt: int = 1):
+    # sync variant for use inside db.run_tx transactions
+    conn.execute(
+        "INSERT INTO inventory(user_id, char_id, count) VALUES(?,?,?) "
+        "ON CONFLICT(user_id, char_id) DO UPDATE SET count = count + excluded.count",
+        (user_id, char_id, amt)
+    )
+
+def add_exp_tx(conn, user_id: int, amt: int = 0):
+    # read and write in one transaction so concurrent gains add up
+    row = conn.execute("SELECT level,exp FROM users WHERE id=?", (user_id,)).fetchone()
     if not row:
         return False, None
     lvl, exp = row
@@ -55,19 +91,15 @@ async def add_exp(user_id: int, amt: int = 0):
         exp -= lvl * 100
         lvl += 1
         leveled = True
-    await db.execute("UPDATE users SET level=?, exp=? WHERE id=?", (lvl, exp, user_id), commit=True)
+    conn.execute("UPDATE users SET level=?, exp=? WHERE id=?", (lvl, exp, user_id))
     return leveled, lvl
 
+async def add_exp(user_id: int, amt: int = 0):
+    return await db.run_tx(add_exp_tx, user_id, amt)
+
 async def format_char(row: Tuple[Any, ...]) -> str:
-    # row: (id, name, rarity, faction, power, price, file_id)
-    return (
-        f"🆔 ID: {row[0]}\n"
-        f"✨ Name: {row[1]}\n"
-        f"⭐ Rarity: {row[2]}\n"
-        f"🏹 Faction: {row[3]}\n"
-        f"💪 Power: {row[4]}\n"
-        f"💰 Price: {row[5]}"
-    )
+    # row: (id, name, rarity, faction, power, price, file_id); prefer card_cache captions
+    return render_caption(Character.from_row(row))
 
 async def get_total_power(user_id: int) -> int:
     row = await db.fetchone(
@@ -136,13 +168,14 @@ async def battle_animation(msg: Message, me: str, enemy: str):
             pass
         await asyncio.sleep(1.0)
 
-async def choose_chars(n: int) -> List[Tuple]:
-    rows = await db.fetchall("SELECT * FROM characters") or []
+async def choose_chars(n: int) -> List[Tuple[str, Card]]:
+    """(rolled rarity, card) per pull; an empty rarity pool falls back to any character."""
+    rows, by_rarity = await catalog.get()
     if not rows:
         return []
     res = []
     for _ in range(n):
-        r = roll_rarity()
-        pool = [x for x in rows if x[2] == r] or rows
-        res.append(random.choice(pool))
+        rolled = roll_rarity()
+        pool = by_rarity.get(rolled) or rows
+        res.append((rolled, card_cache.from_row(random.choice(pool))))
     return res